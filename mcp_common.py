@@ -0,0 +1,346 @@
+# mcp_common.py
+"""
+Shared pieces of the Kaedim MCP clients (run_agent.py / run_agent_http.py) and the stdio server
+"""
+
+import asyncio
+import functools
+import json
+import os
+import re
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+# -------------------------------
+# Optional fast JSON
+# -------------------------------
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+
+# -------------------------------
+# Data models
+# -------------------------------
+@dataclass
+class Decision:
+    request_id: str
+    decision_id: str
+    status: str  # 'success' | 'validation_failed' | 'assignment_failed'
+    rationale: Optional[str]
+    customer_message: Optional[str]
+    clarifying_question: Optional[str]
+    validation_result: Dict[str, Any]
+    plan: Dict[str, Any]
+    assignment: Dict[str, Any]
+    trace: List[Dict[str, Any]]
+    metrics: Dict[str, Any]
+    timestamp: str
+
+
+def decision_to_dict(d: Decision) -> Dict[str, Any]:
+    """Top-level dict of a Decision's fields; nested values are shared, not copied (unlike asdict)."""
+    return {
+        "request_id": d.request_id,
+        "decision_id": d.decision_id,
+        "status": d.status,
+        "rationale": d.rationale,
+        "customer_message": d.customer_message,
+        "clarifying_question": d.clarifying_question,
+        "validation_result": d.validation_result,
+        "plan": d.plan,
+        "assignment": d.assignment,
+        "trace": d.trace,
+        "metrics": d.metrics,
+        "timestamp": d.timestamp,
+    }
+
+
+def summarize_args(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """Log-friendly view of tool args: scalars as-is, containers as type + length (never full decisions)."""
+    return {
+        k: v if v is None or isinstance(v, (str, int, float, bool)) else f"<{type(v).__name__} len={len(v)}>"
+        for k, v in arguments.items()
+    }
+
+
+# -------------------------------
+# Timestamps
+# -------------------------------
+_ts_second = [None, ""]  # [epoch second, "YYYY-MM-DDTHH:MM:SS" in local time] of the last call
+
+
+def _format_ns(ns: int) -> str:
+    """datetime.fromtimestamp(ns / 1e9).isoformat() without building a datetime per call.
+
+    The local-time prefix is only re-rendered when the second changes, so DST and date
+    rollovers are still picked up.
+    """
+    sec, us = divmod(ns // 1000, 1_000_000)
+    if _ts_second[0] != sec:
+        _ts_second[0], _ts_second[1] = sec, time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(sec))
+    # isoformat() drops the fraction entirely on a whole second
+    return f"{_ts_second[1]}.{us:06d}" if us else _ts_second[1]
+
+
+def now_iso() -> str:
+    """Local wall-clock ISO-8601 timestamp for traces and decisions (same format as datetime.now().isoformat())."""
+    return _format_ns(time.time_ns())
+
+
+# -------------------------------
+# Decisions file
+# -------------------------------
+def dump_record(record: Dict[str, Any], *, indent: bool = True) -> bytes:
+    if HAS_ORJSON:
+        return orjson.dumps(record, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(record, indent=2 if indent else None).encode("utf-8")
+
+
+class DecisionWriter:
+    """Incremental decisions file: a JSON array (`json`) or one compact object per line (`ndjson`).
+
+    Records are encoded and written as they arrive, so nothing has to hold the whole batch.
+    """
+
+    FORMATS = ("json", "ndjson")
+
+    def __init__(self, path: str | Path, fmt: str = "json"):
+        if fmt not in self.FORMATS:
+            raise ValueError(f"Unknown decisions format: {fmt}")
+        self.path = Path(path)
+        self.fmt = fmt
+        self.count = 0
+        self._f = None
+
+    def __enter__(self) -> "DecisionWriter":
+        self._f = self.path.open("wb", buffering=1 << 20)
+        if self.fmt == "json":
+            self._f.write(b"[")
+        return self
+
+    def write(self, decision: Decision) -> None:
+        record = decision_to_dict(decision)
+        if self.fmt == "ndjson":
+            self._f.write(dump_record(record, indent=False) + b"\n")
+        else:
+            self._f.write(b",\n" if self.count else b"\n")
+            self._f.write(dump_record(record))
+        self.count += 1
+
+    def __exit__(self, *exc) -> None:
+        if self.fmt == "json":
+            self._f.write(b"\n]\n" if self.count else b"]\n")
+        self._f.close()
+
+
+def write_decisions(path: str | Path, decisions: Iterable[Decision], fmt: str = "json") -> None:
+    """Write `decisions` to `path` in one go (see DecisionWriter for the formats)."""
+    with DecisionWriter(path, fmt) as writer:
+        for d in decisions:
+            writer.write(d)
+
+
+# -------------------------------
+# Validation error taxonomy
+# -------------------------------
+def _keyword_regex(table: tuple) -> "re.Pattern[str]":
+    """One case-insensitive alternation over a (key, keywords) table; each key becomes a named group.
+
+    Wrapped in a lookahead so every start position is tried and overlapping phrases all report.
+    """
+    alternation = "|".join(f"(?P<{key}>{'|'.join(map(re.escape, kws))})" for key, kws in table)
+    return re.compile(f"(?=(?:{alternation}))", re.IGNORECASE)
+
+
+# Taxonomy keys that extract a value from the error text; every other key is a plain flag
+def _on_missing_channels(e: str, info: Dict[str, Any]) -> None:
+    parts = e.split(":", 1)
+    if len(parts) == 2:
+        chans = [c.strip().lower() for c in parts[1].replace(",", " ").split()]
+        info["missing_channels"] = [c for c in chans if c in {"r", "g", "b", "a"}]
+    else:
+        info["missing_channels"] = ["r", "g", "b", "a"]
+
+
+def _on_engine_unsupported(e: str, info: Dict[str, Any]) -> None:
+    parts = e.split(":", 1)
+    info["engine_unsupported"] = parts[1].strip() if len(parts) == 2 else True
+
+
+def _on_unsupported_maps(e: str, info: Dict[str, Any]) -> None:
+    parts = e.split(":", 1)
+    if len(parts) == 2:
+        info["unsupported_maps"].append(parts[1].strip())
+
+
+def _on_map_conflicts(e: str, info: Dict[str, Any]) -> None:
+    info["map_conflicts"].append(e)
+
+
+# Taxonomy key -> trigger phrases (case-insensitive), scanned in one regex pass per error line
+VALIDATION_KEYWORDS = (
+    ("missing_channels", ("missing texture channels",)),
+    ("no_packing", ("no texture packing configuration",)),
+    ("version_missing", ("preset version not specified",)),
+    ("engine_missing", ("engine not specified", "missing engine")),
+    ("engine_unsupported", ("unsupported engine", "engine not supported")),
+    ("unsupported_maps", ("unsupported map", "unsupported texture")),
+    ("map_conflicts", ("conflicting maps", "map conflict")),
+    ("topology_quad_only", ("quad only", "quad-only")),
+    ("uv_missing", ("missing uvs", "uvs not found")),
+    ("uv_overlap", ("uv overlap", "overlapping uvs")),
+    ("size_exceeds", ("exceeds max texture size", "texture too large")),
+    ("polycount_exceeds", ("exceeds polycount", "polycount too high")),
+)
+_ERR_RE = _keyword_regex(VALIDATION_KEYWORDS)
+_ERR_HANDLERS = {
+    "missing_channels": _on_missing_channels,
+    "engine_unsupported": _on_engine_unsupported,
+    "unsupported_maps": _on_unsupported_maps,
+    "map_conflicts": _on_map_conflicts,
+}
+# Looser phrasing of version_missing ("version ... not ... specified", any order)
+_VERSION_LOOSE_RE = re.compile(r"^(?=.*version)(?=.*not)(?=.*specified)", re.IGNORECASE | re.DOTALL)
+
+
+@functools.lru_cache(maxsize=4096)
+def error_keys(e: str) -> frozenset:
+    """Taxonomy keys one error line triggers; the regex scan is memoized per distinct line."""
+    keys = {m.lastgroup for m in _ERR_RE.finditer(e)}
+    if _VERSION_LOOSE_RE.search(e):
+        keys.add("version_missing")
+    return frozenset(keys)
+
+
+def parse_validation_errors(validation: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalize validator errors into a small taxonomy we can message on.
+    Returns keys like: {missing_channels:["a"], no_packing:True, version_missing:True, engine_missing:True, engine_unsupported:"CryEngine", unsupported_maps:["specular"], topology_quad_only:True, uv_missing:True, uv_overlap:True, size_exceeds:True, polycount_exceeds:True}
+    """
+    errs = [str(e) for e in (validation or {}).get("errors", [])]
+    info: Dict[str, Any] = {
+        "missing_channels": [],
+        "no_packing": False,
+        "version_missing": False,
+        "engine_missing": False,
+        "engine_unsupported": None,
+        "unsupported_maps": [],
+        "map_conflicts": [],
+        "topology_quad_only": False,
+        "uv_missing": False,
+        "uv_overlap": False,
+        "size_exceeds": False,
+        "polycount_exceeds": False,
+    }
+    for e in errs:
+        # A key fires at most once per error line, however many of its phrases appear
+        for key in error_keys(e):
+            handler = _ERR_HANDLERS.get(key)
+            if handler is None:
+                info[key] = True
+            else:
+                handler(e, info)
+    return info
+
+
+# Ordered first-match rules over the parsed taxonomy: (info keys that must all be set,
+# text or info -> text). Messages and questions rank the keys differently, hence two tables.
+MESSAGE_RULES = (
+    (("no_packing", "version_missing"),
+     "Validation error: No texture packing configuration found and no preset version specified. Please add a packing map (e.g., RGBA layout) and set a preset version."),
+    (("no_packing",),
+     "Validation error: No texture packing configuration found. Please provide how channels should be packed (e.g., R: AO, G: Roughness, B: Metallic, A: Emissive)."),
+    (("missing_channels",),
+     lambda info: f"Your texture packing is missing channel(s): {', '.join(info['missing_channels']).upper()}. Please include those channels or confirm a default mapping so we can export engine-ready textures."),
+    (("unsupported_maps",),
+     lambda info: f"One or more requested texture maps are not supported ({', '.join(info['unsupported_maps'])}). Please remove them or choose supported equivalents."),
+    (("map_conflicts",),
+     "There are conflicting map assignments in your preset. Please resolve duplicate or overlapping map targets before we proceed."),
+    (("engine_missing",),
+     "Target engine is not specified. Please select an engine so we can apply the correct export and validation rules."),
+    (("engine_unsupported",),
+     lambda info: "The selected engine is not supported{}. Please choose a supported engine (e.g., Unreal or Unity).".format(
+         f" ({info['engine_unsupported']})" if isinstance(info["engine_unsupported"], str) else "")),
+    (("topology_quad_only",),
+     "The preset enforces quad-only topology, but the model doesn't meet this requirement. Please provide a quad-only mesh or relax the topology rule."),
+    (("uv_missing",),
+     "The model is missing UVs. Please include UVs or allow us to auto-unwrap before texturing."),
+    (("uv_overlap",),
+     "The model has overlapping UVs beyond allowed thresholds. Please fix the UVs or permit us to auto-fix with packing."),
+    (("size_exceeds",),
+     "One or more textures exceed the maximum supported size. Please reduce texture dimensions or approve downscaling."),
+    (("polycount_exceeds",),
+     "The mesh exceeds the permitted polycount. Please provide a lower-poly version or allow us to decimate to target."),
+)
+QUESTION_RULES = (
+    (("missing_channels",),
+     lambda info: f"We detected missing channel(s) {', '.join(info['missing_channels']).upper()}. Should we apply a default mapping (e.g., map A to emissive) or would you prefer to update your preset first?"),
+    (("no_packing",),
+     "Would you like us to apply a standard packing template (e.g., AO/Roughness/Metallic/Emissive) for this batch, or wait for your custom packing settings?"),
+    (("version_missing",),
+     "Do you want us to assume the latest preset version, or will you specify the version you’re targeting?"),
+    (("unsupported_maps",),
+     "Should we drop the unsupported maps or substitute with supported equivalents (e.g., use ORM instead of separate roughness/metallic)?"),
+    (("map_conflicts",),
+     "Would you like us to auto-resolve the conflicting map assignments using a recommended template, or will you correct the preset?"),
+    (("engine_missing",),
+     "Which engine should we target for export and validation (e.g., Unreal or Unity)?"),
+    (("engine_unsupported",),
+     "Would you like to switch to a supported engine (e.g., Unreal or Unity), or should we stop this batch?"),
+    (("topology_quad_only",),
+     "Should we enforce quad-only by retopologizing automatically, or wait for you to provide a quad-only mesh?"),
+    (("uv_missing",),
+     "Do you want us to auto-unwrap UVs, or will you provide a mesh with UVs?"),
+    (("uv_overlap",),
+     "Should we auto-fix overlapping UVs (may adjust pack/scale), or do you prefer to fix them on your side?"),
+    (("size_exceeds",),
+     "Is it okay if we downscale oversized textures to the nearest supported resolution, or would you like to upload smaller maps?"),
+    (("polycount_exceeds",),
+     "Do you want us to decimate the mesh to the target polycount, or will you provide a lighter model?"),
+)
+
+
+def first_rule(rules, info: Dict[str, Any]) -> Optional[str]:
+    for keys, text in rules:
+        if all(info.get(k) for k in keys):
+            return text(info) if callable(text) else text
+    return None
+
+
+def classify_validation(validation: Dict[str, Any]) -> tuple[str, Optional[str]]:
+    """(customer_message, clarifying_question) for a validate_preset result, from a single taxonomy parse."""
+    if validation.get("ok"):
+        return "", None
+    info = parse_validation_errors(validation)
+    message = first_rule(MESSAGE_RULES, info)
+    if message is None:
+        message = "Validation error: " + "; ".join(str(e) for e in validation.get("errors") or [])
+    question = first_rule(QUESTION_RULES, info)
+    if question is None:
+        question = "Would you like us to apply sensible defaults now, or wait for your preset update?"
+    return message, question
+
+
+# -------------------------------
+# LLM
+# -------------------------------
+def llm_semaphore() -> asyncio.Semaphore:
+    """Caps in-flight completions (LLM_CONCURRENCY, default 6) so the concurrent fan-out doesn't dogpile the endpoint."""
+    return asyncio.Semaphore(int(os.getenv("LLM_CONCURRENCY", "6")))
+
+
+# -------------------------------
+# Event loop
+# -------------------------------
+def run_async(coro) -> Any:
+    """asyncio.run() on uvloop when it is installed (Linux/macOS), else the default loop."""
+    try:
+        import uvloop
+    except ImportError:
+        return asyncio.run(coro)
+    with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
+        return runner.run(coro)
@@ -19,6 +19,8 @@ import mcp.types as types
 from mcp.server import NotificationOptions, Server
 from mcp.server.models import InitializationOptions
 
+from mcp_common import run_async
+
 # ✅ Configure logging to use stderr for console output
 logging.basicConfig(
     level=logging.INFO,
@@ -65,6 +67,8 @@ class KaedimMCPServer:
         self.artists = self._load_json("artists.json")
         self.presets = self._load_json("presets.json")
         self.rules = self._load_json("rules.json")
+        # id -> request for the per-call tool lookups; reversed so the first duplicate id wins, as a scan would
+        self.requests_by_id: Dict[str, Dict[str, Any]] = {r["id"]: r for r in reversed(self.requests)}
 
         # Setup handlers
         self._setup_handlers()
@@ -210,6 +214,58 @@ class KaedimMCPServer:
                         "required": ["request_id", "decision"],
                     },
                 ),
+                types.Tool(
+                    name="record_decisions",
+                    description="Record a batch of routing decisions in a single call",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "items": {
+                                "type": "array",
+                                "description": "Decisions to record, each {request_id, decision}",
+                                "items": {
+                                    "type": "object",
+                                    "properties": {
+                                        "request_id": {"type": "string"},
+                                        "decision": {"type": "object"},
+                                    },
+                                    "required": ["request_id", "decision"],
+                                },
+                            },
+                        },
+                        "required": ["items"],
+                    },
+                ),
+                types.Tool(
+                    name="batch_execute",
+                    description="Run several tool calls in one round-trip; results come back in call order",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "operations": {
+                                "type": "array",
+                                "description": "Tool calls to run, each {tool, arguments}",
+                                "items": {
+                                    "type": "object",
+                                    "properties": {
+                                        "tool": {"type": "string"},
+                                        "arguments": {"type": "object"},
+                                    },
+                                    "required": ["tool", "arguments"],
+                                },
+                            },
+                            "max_concurrent": {
+                                "type": "integer",
+                                "description": "Operations run at once (default 8)",
+                            },
+                            "stop_on_error": {
+                                "type": "boolean",
+                                "description": "Run in order and skip the rest after the first failure",
+                            },
+                        },
+                        "required": ["operations"],
+                    },
+                ),
             ]
 
         @self.server.call_tool()
@@ -221,20 +277,14 @@ class KaedimMCPServer:
             self._emit_event("tool.called", {"tool": name, "arguments": arguments})
 
             try:
-                if name == "validate_preset":
-                    result = await self._validate_preset(
-                        arguments["request_id"], arguments["account_id"]
-                    )
-                elif name == "plan_steps":
-                    result = await self._plan_steps(arguments["request_id"])
-                elif name == "assign_artist":
-                    result = await self._assign_artist(arguments["request_id"])
-                elif name == "record_decision":
-                    result = await self._record_decision(
-                        arguments["request_id"], arguments["decision"]
+                if name == "batch_execute":
+                    result = await self._batch_execute(
+                        arguments["operations"],
+                        arguments.get("max_concurrent", 8),
+                        arguments.get("stop_on_error", False),
                     )
                 else:
-                    raise ValueError(f"Unknown tool: {name}")
+                    result = await self._dispatch(name, arguments)
 
                 duration_ms = int(
                     (datetime.now(timezone.utc) - start_time).total_seconds() * 1000
@@ -252,11 +302,59 @@ class KaedimMCPServer:
                 self._emit_event("tool.failed", {"tool": name, "error": str(e)})
                 raise
 
+    async def _dispatch(self, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """Route one tool call to its implementation"""
+        if name == "validate_preset":
+            return await self._validate_preset(
+                arguments["request_id"], arguments["account_id"]
+            )
+        elif name == "plan_steps":
+            return await self._plan_steps(arguments["request_id"])
+        elif name == "assign_artist":
+            return await self._assign_artist(arguments["request_id"])
+        elif name == "record_decision":
+            return await self._record_decision(
+                arguments["request_id"], arguments["decision"]
+            )
+        elif name == "record_decisions":
+            return await self._record_decisions(arguments["items"])
+        else:
+            raise ValueError(f"Unknown tool: {name}")
+
+    async def _batch_execute(
+        self,
+        operations: List[Dict[str, Any]],
+        max_concurrent: int = 8,
+        stop_on_error: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """Run several tool calls in one round-trip; one {index, tool, ok, result|error} per operation"""
+        sem = asyncio.Semaphore(max(1, max_concurrent))
+
+        async def _run(index: int, op: Dict[str, Any]) -> Dict[str, Any]:
+            tool = op.get("tool")
+            async with sem:
+                try:
+                    result = await self._dispatch(tool, op.get("arguments") or {})
+                except Exception as e:
+                    return {"index": index, "tool": tool, "ok": False, "error": str(e)}
+            return {"index": index, "tool": tool, "ok": True, "result": result}
+
+        if not stop_on_error:
+            return list(await asyncio.gather(*(_run(i, op) for i, op in enumerate(operations))))
+
+        results: List[Dict[str, Any]] = []
+        for i, op in enumerate(operations):
+            if results and not results[-1]["ok"]:
+                results.append({"index": i, "tool": op.get("tool"), "ok": False, "error": "skipped"})
+            else:
+                results.append(await _run(i, op))
+        return results
+
     async def _validate_preset(
         self, request_id: str, account_id: str
     ) -> Dict[str, Any]:
         """Validate request against customer preset"""
-        request = next((r for r in self.requests if r["id"] == request_id), None)
+        request = self.requests_by_id.get(request_id)
         if not request:
             return {"ok": False, "errors": [f"Request {request_id} not found"]}
 
@@ -306,7 +404,7 @@ class KaedimMCPServer:
 
     async def _plan_steps(self, request_id: str) -> Dict[str, Any]:
         """Generate processing steps based on rules"""
-        request = next((r for r in self.requests if r["id"] == request_id), None)
+        request = self.requests_by_id.get(request_id)
         if not request:
             return {
                 "steps": [],
@@ -357,7 +455,7 @@ class KaedimMCPServer:
 
     async def _assign_artist(self, request_id: str) -> Dict[str, Any]:
         """Assign request to optimal artist with priority-aware, capacity-aware, lexicographic ranking."""
-        request = next((r for r in self.requests if r["id"] == request_id), None)
+        request = self.requests_by_id.get(request_id)
         if not request:
             return {"artist_id": None, "reason": f"Request {request_id} not found", "alternative_artists": []}
 
@@ -376,20 +474,22 @@ class KaedimMCPServer:
 
         is_priority = _is_priority(request)
 
+        style_words = style.replace("_", " ")
         rows = []
         for artist in self.artists:
             reasons = []
             skills = [s.lower() for s in artist.get("skills", [])]
+            skills_text = " ".join(skills)  # substring matches below share one join
 
             # --- Skill match buckets ---
             skill_score = 0
-            if style and (style in skills or style.replace("_", " ") in " ".join(skills)):
+            if style and (style in skills or style_words in skills_text):
                 skill_score += 10
                 reasons.append(f"matches style {style}")
             if engine and engine in skills:
                 skill_score += 5
                 reasons.append(f"matches engine {engine}")
-            if topology and topology in " ".join(skills):
+            if topology and topology in skills_text:
                 skill_score += 5
                 reasons.append(f"matches topology {topology}")
 
@@ -507,6 +607,16 @@ class KaedimMCPServer:
             "status": decision.status,
         }
 
+    async def _record_decisions(
+        self, items: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Record a batch of routing decisions (one tool round-trip for N decisions)"""
+        recorded = [
+            await self._record_decision(item["request_id"], item["decision"])
+            for item in items
+        ]
+        return {"count": len(recorded), "decisions": recorded}
+
     async def run(self):
         """Run the MCP server"""
         async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
@@ -535,4 +645,4 @@ if __name__ == "__main__":
     data_dir = Path(sys.argv[1]) if len(sys.argv) > 1 else Path("./data")
 
     server = KaedimMCPServer(data_dir)
-    asyncio.run(server.run())
+    run_async(server.run())
@@ -15,9 +15,19 @@ from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
-from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse, PlainTextResponse
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
+
+# -------------------------------
+# Optional msgpack request bodies
+# -------------------------------
+try:
+    import msgpack
+    HAS_MSGPACK = True
+except Exception:
+    HAS_MSGPACK = False
 
 # -------------------------------
 # Logging
@@ -81,10 +91,26 @@ class CallToolBody(BaseModel):
     arguments: Dict[str, Any]
 
 
+class CallToolsBody(BaseModel):
+    calls: List[CallToolBody]
+
+
 # -------------------------------
 # Server implementation
 # -------------------------------
 class KaedimMCPServer:
+    # Tool name -> required argument keys; bad or missing arguments are the caller's error (400)
+    TOOL_ARGS: Dict[str, tuple] = {
+        "validate_preset": ("request_id", "account_id"),
+        "plan_steps": ("request_id",),
+        "assign_artist": ("request_id",),
+        "record_decision": ("request_id", "decision"),
+        "record_decisions": ("items",),
+        "record_decision_delta": ("request_id", "delta"),
+        "record_decisions_delta": ("items",),
+        "process_request": ("request_id",),
+    }
+
     def __init__(self, data_dir: Path = Path("./data")):
         self.data_dir = data_dir
         self.decisions: List[Decision] = []
@@ -94,6 +120,8 @@ class KaedimMCPServer:
         self.artists = self._load_json("artists.json")
         self.presets = self._load_json("presets.json")
         self.rules = self._load_json("rules.json")
+        # id -> request for the per-call tool lookups; reversed so the first duplicate id wins, as a scan would
+        self.requests_by_id: Dict[str, Dict[str, Any]] = {r["id"]: r for r in reversed(self.requests)}
 
     def _load_json(self, filename: str) -> Any:
         filepath = self.data_dir / filename
@@ -215,13 +243,96 @@ class KaedimMCPServer:
                     "required": ["request_id", "decision"],
                 },
             },
+            {
+                "name": "record_decisions",
+                "description": "Record a batch of routing decisions in a single call",
+                "inputSchema": {
+                    "type": "object",
+                    "properties": {
+                        "items": {
+                            "type": "array",
+                            "description": "Decisions to record, each {request_id, decision}",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "request_id": {"type": "string"},
+                                    "decision": {"type": "object"},
+                                },
+                                "required": ["request_id", "decision"],
+                            },
+                        },
+                    },
+                    "required": ["items"],
+                },
+            },
+            {
+                "name": "record_decision_delta",
+                "description": "Record a decision sent without the validation/plan/assignment results already in its trace",
+                "inputSchema": {
+                    "type": "object",
+                    "properties": {
+                        "request_id": {"type": "string", "description": "Request ID"},
+                        "delta": {
+                            "type": "object",
+                            "description": "Decision minus validation_result, plan and assignment",
+                        },
+                    },
+                    "required": ["request_id", "delta"],
+                },
+            },
+            {
+                "name": "record_decisions_delta",
+                "description": "Record a batch of delta decisions in a single call",
+                "inputSchema": {
+                    "type": "object",
+                    "properties": {
+                        "items": {
+                            "type": "array",
+                            "description": "Decisions to record, each {request_id, delta}",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "request_id": {"type": "string"},
+                                    "delta": {"type": "object"},
+                                },
+                                "required": ["request_id", "delta"],
+                            },
+                        },
+                    },
+                    "required": ["items"],
+                },
+            },
+            {
+                "name": "process_request",
+                "description": "Run validate_preset, then plan_steps and assign_artist if validation passes, in one call",
+                "inputSchema": {
+                    "type": "object",
+                    "properties": {
+                        "request_id": {
+                            "type": "string",
+                            "description": "Request ID to process",
+                        },
+                    },
+                    "required": ["request_id"],
+                },
+            },
         ]
 
-    async def call_tool(self, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    async def call_tool(self, name: str, arguments: Dict[str, Any], *, native: bool = False) -> Dict[str, Any]:
+        """Run a tool. `native` returns the result as {"data": ...} instead of an MCP text block."""
         start_time = datetime.now(timezone.utc)
         self._emit_event("tool.called", {"tool": name, "arguments": arguments})
 
         try:
+            required = self.TOOL_ARGS.get(name)
+            if required is None:
+                raise HTTPException(status_code=400, detail=f"Unknown tool: {name}")
+            if not isinstance(arguments, dict):
+                raise HTTPException(status_code=400, detail=f"Arguments for {name} must be an object")
+            missing = [k for k in required if k not in arguments]
+            if missing:
+                raise HTTPException(status_code=400, detail=f"Missing argument(s) for {name}: {', '.join(missing)}")
+
             if name == "validate_preset":
                 result = await self._validate_preset(
                     arguments["request_id"], arguments["account_id"]
@@ -234,6 +345,16 @@ class KaedimMCPServer:
                 result = await self._record_decision(
                     arguments["request_id"], arguments["decision"]
                 )
+            elif name == "record_decisions":
+                result = await self._record_decisions(arguments["items"])
+            elif name == "record_decision_delta":
+                result = await self._record_decision_delta(
+                    arguments["request_id"], arguments["delta"]
+                )
+            elif name == "record_decisions_delta":
+                result = await self._record_decisions_delta(arguments["items"])
+            elif name == "process_request":
+                result = await self._process_request(arguments["request_id"])
             else:
                 raise HTTPException(status_code=400, detail=f"Unknown tool: {name}")
 
@@ -244,6 +365,8 @@ class KaedimMCPServer:
                 "tool.completed",
                 {"tool": name, "duration_ms": duration_ms, "success": True},
             )
+            if native:
+                return {"data": result}
             # emulate the MCP content shape (text blob)
             return {"content": [{"type": "text", "text": json.dumps(result, indent=2)}]}
         except HTTPException:
@@ -257,7 +380,7 @@ class KaedimMCPServer:
     async def _validate_preset(
         self, request_id: str, account_id: str
     ) -> Dict[str, Any]:
-        request = next((r for r in self.requests if r["id"] == request_id), None)
+        request = self.requests_by_id.get(request_id)
         if not request:
             return {"ok": False, "errors": [f"Request {request_id} not found"]}
 
@@ -304,7 +427,7 @@ class KaedimMCPServer:
         }
 
     async def _plan_steps(self, request_id: str) -> Dict[str, Any]:
-        request = next((r for r in self.requests if r["id"] == request_id), None)
+        request = self.requests_by_id.get(request_id)
         if not request:
             return {
                 "steps": [],
@@ -350,7 +473,7 @@ class KaedimMCPServer:
 
     async def _assign_artist(self, request_id: str) -> Dict[str, Any]:
         """Assign request to optimal artist with priority-aware, capacity-aware, lexicographic ranking."""
-        request = next((r for r in self.requests if r["id"] == request_id), None)
+        request = self.requests_by_id.get(request_id)
         if not request:
             return {
                 "artist_id": None,
@@ -373,22 +496,24 @@ class KaedimMCPServer:
 
         is_priority = _is_priority(request)
 
+        style_words = style.replace("_", " ")
         rows = []
         for artist in self.artists:
             reasons = []
             skills = [s.lower() for s in artist.get("skills", [])]
+            skills_text = " ".join(skills)  # substring matches below share one join
 
             # --- Skill match buckets ---
             skill_score = 0
             if style and (
-                style in skills or style.replace("_", " ") in " ".join(skills)
+                style in skills or style_words in skills_text
             ):
                 skill_score += 10
                 reasons.append(f"matches style {style}")
             if engine and engine in skills:
                 skill_score += 5
                 reasons.append(f"matches engine {engine}")
-            if topology and topology in " ".join(skills):
+            if topology and topology in skills_text:
                 skill_score += 5
                 reasons.append(f"matches topology {topology}")
 
@@ -499,6 +624,53 @@ class KaedimMCPServer:
             "status": decision.status,
         }
 
+    async def _record_decisions(
+        self, items: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        recorded = [
+            await self._record_decision(item["request_id"], item["decision"])
+            for item in items
+        ]
+        return {"count": len(recorded), "decisions": recorded}
+
+    async def _record_decision_delta(
+        self, request_id: str, delta: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        # validation_result/plan/assignment are the latest trace results of their tools, so the
+        # client leaves them out of the payload and they are rebuilt here
+        results = {entry.get("step"): entry.get("result") for entry in delta.get("trace", [])}
+        return await self._record_decision(
+            request_id,
+            {
+                **delta,
+                "validation_result": results.get("validate_preset") or {},
+                "plan": results.get("plan_steps") or {},
+                "assignment": results.get("assign_artist") or {},
+            },
+        )
+
+    async def _record_decisions_delta(
+        self, items: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        recorded = [
+            await self._record_decision_delta(item["request_id"], item["delta"])
+            for item in items
+        ]
+        return {"count": len(recorded), "decisions": recorded}
+
+    async def _process_request(self, request_id: str) -> Dict[str, Any]:
+        # The fixed pipeline in one round-trip; plan/assign are skipped (None) when validation fails
+        request = self.requests_by_id.get(request_id)
+        account = request["account"] if request else ""
+        validation = await self._validate_preset(request_id, account)
+        if not validation.get("ok"):
+            return {"validation_result": validation, "plan_result": None, "assignment_result": None}
+        return {
+            "validation_result": validation,
+            "plan_result": await self._plan_steps(request_id),
+            "assignment_result": await self._assign_artist(request_id),
+        }
+
 
 # -------------------------------
 # FastAPI app & routes
@@ -516,9 +688,9 @@ async def _startup():
     logger.info(f"Server initialized with data_dir={data_dir.resolve()}")
 
 
-@app.get("/health")
+@app.api_route("/health", methods=["GET", "HEAD"])  # HEAD for probes that only need the status
 async def health():
-    return {"ok": True, "time": datetime.now(timezone.utc).isoformat()}
+    return {"ok": True, "status": "healthy", "time": datetime.now(timezone.utc).isoformat()}
 
 
 @app.post("/initialize", dependencies=[Depends(require_auth)])
@@ -530,7 +702,11 @@ async def initialize():
         "capabilities": {
             "resources": True,
             "tools": True,
+            "process_request": True,  # fused validate → plan → assign tool
+            "record_decision_delta": True,  # decisions may omit results already in their trace
         },
+        # "ws": tool calls may also be multiplexed over one WebSocket at /ws
+        "transports": ["http", "ws"],
     }
 
 
@@ -551,9 +727,91 @@ async def list_tools():
     return {"tools": await _server.list_tools()}  # type: ignore
 
 
+def _prefers_data(request: Request) -> bool:
+    # Clients that send this header get tool results as a native `data` field, skipping the
+    # JSON-in-a-text-block envelope they would otherwise have to parse a second time
+    return request.headers.get("x-client-prefers-data") == "1"
+
+
 @app.post("/call_tool", dependencies=[Depends(require_auth)])
-async def call_tool(body: CallToolBody):
-    return await _server.call_tool(body.name, body.arguments)  # type: ignore
+async def call_tool(request: Request):
+    # JSON by default; clients may send large record_decision(s) payloads as msgpack
+    raw = await request.body()
+    content_type = request.headers.get("content-type", "")
+    try:
+        if content_type.startswith("application/msgpack"):
+            if not HAS_MSGPACK:
+                raise HTTPException(status_code=415, detail="msgpack not supported by this server")
+            body = CallToolBody.model_validate(msgpack.unpackb(raw, raw=False))
+        else:
+            body = CallToolBody.model_validate_json(raw)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+    return await _server.call_tool(body.name, body.arguments, native=_prefers_data(request))  # type: ignore
+
+
+@app.post("/call_tools", dependencies=[Depends(require_auth)])
+async def call_tools(body: CallToolsBody, request: Request):
+    # Several tool calls in one round-trip, run in order; a failing call doesn't abort the rest
+    native = _prefers_data(request)
+    results: List[Dict[str, Any]] = []
+    for call in body.calls:
+        try:
+            results.append(await _server.call_tool(call.name, call.arguments, native=native))  # type: ignore
+        except HTTPException as e:
+            results.append({"isError": True, "status_code": e.status_code, "detail": e.detail})
+    return {"results": results}
+
+
+@app.websocket("/ws")
+async def ws_tools(websocket: WebSocket):
+    # One connection, many in-flight tool calls: each frame is {"id", "name", "arguments"} and the
+    # reply echoes "id" with either native "data" or the same error fields /call_tools uses
+    try:
+        require_auth(websocket)  # type: ignore[arg-type]
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=str(e.detail))
+        return
+    await websocket.accept()
+    send_lock = asyncio.Lock()
+    tasks: set = set()
+
+    async def _send(reply: Dict[str, Any]) -> None:
+        async with send_lock:
+            await websocket.send_text(json.dumps(reply))
+
+    async def _run(frame: Dict[str, Any]) -> None:
+        # Any failure becomes an error frame for this call id; the connection stays up
+        try:
+            name = frame.get("name")
+            if not isinstance(name, str):
+                raise HTTPException(status_code=400, detail="Frame needs a string 'name'")
+            reply = await _server.call_tool(name, frame.get("arguments") or {}, native=True)  # type: ignore
+        except HTTPException as e:
+            reply = {"isError": True, "status_code": e.status_code, "detail": e.detail}
+        except Exception as e:
+            logger.exception(f"WebSocket tool call {frame.get('name')!r} failed")
+            reply = {"isError": True, "status_code": 500, "detail": f"{type(e).__name__}: {e}"}
+        reply["id"] = frame.get("id")
+        await _send(reply)
+
+    try:
+        while True:
+            text = await websocket.receive_text()
+            try:
+                frame = json.loads(text)
+                if not isinstance(frame, dict):
+                    raise ValueError("frame is not a JSON object")
+            except ValueError as e:
+                # No call id to echo; the sender can only time the call out
+                await _send({"id": None, "isError": True, "status_code": 400, "detail": f"Malformed frame: {e}"})
+                continue
+            task = asyncio.create_task(_run(frame))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    except WebSocketDisconnect:
+        for task in tasks:
+            task.cancel()
 
 
 # -------------------------------
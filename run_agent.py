@@ -30,8 +30,8 @@ import json
 import logging
 import os
 import sys
-from dataclasses import asdict, dataclass
-from datetime import datetime
+import time
+from collections import Counter
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
@@ -48,18 +48,42 @@ except Exception:
 # -------------------------------
 # MCP imports
 # -------------------------------
+import anyio  # transport errors raised by the MCP client streams
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
 
+from mcp_common import (
+    Decision, classify_validation, decision_to_dict, dump_record, llm_semaphore, now_iso, run_async, summarize_args,
+    write_decisions,
+)
+
 # -------------------------------
 # Optional LLM integration
 # -------------------------------
 try:
+    import httpx
     from openai import AsyncOpenAI
     HAS_OPENAI = True
 except Exception:
     HAS_OPENAI = False
 
+try:
+    import h2  # noqa: F401  (lets httpx negotiate HTTP/2)
+    HAS_H2 = True
+except Exception:
+    HAS_H2 = False
+
+# -------------------------------
+# Optional fast JSON encoder/decoder
+# -------------------------------
+try:
+    import orjson
+    HAS_ORJSON = True
+except Exception:
+    HAS_ORJSON = False
+
+_loads = orjson.loads if HAS_ORJSON else json.loads
+
 # -------------------------------
 # Logging
 # -------------------------------
@@ -69,28 +93,15 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# -------------------------------
-# Data models
-# -------------------------------
-@dataclass
-class Decision:
-    request_id: str
-    decision_id: str
-    status: str
-    rationale: Optional[str]
-    customer_message: Optional[str]
-    clarifying_question: Optional[str]
-    validation_result: Dict[str, Any]
-    plan: Dict[str, Any]
-    assignment: Dict[str, Any]
-    trace: List[Dict[str, Any]]
-    metrics: Dict[str, Any]
-    timestamp: str
-
 # -------------------------------
 # Base MCP client
 # -------------------------------
 class MCPAgent:
+    # The stdio pipes are gone (server crashed or was killed): reconnect once and retry
+    SESSION_LOST_ERRORS = (anyio.BrokenResourceError, anyio.ClosedResourceError, BrokenPipeError)
+    # Consecutive request failures after which process_all_requests stops starting new requests
+    FAILURE_THRESHOLD = 5
+
     def __init__(
         self,
         data_dir: Path,
@@ -98,15 +109,33 @@ class MCPAgent:
         python_bin: Optional[str] = None,
         agent_type: str = "mcp",
         max_steps: Optional[int] = None,
+        batch_size: int = 8,
+        concurrency: int = 16,
+        parallel_steps: bool = True,
+        checkpoint: Optional[str | Path] = None,
+        resume: bool = False,
         **kwargs: Any,
     ) -> None:
         self.data_dir = Path(data_dir)
         self.server_script = server_script
         self.python_bin = python_bin
         self.agent_type = agent_type
+        self.batch_size = max(1, batch_size)  # requests pre-planned concurrently per offline wave
+        self.concurrency = max(1, concurrency)  # requests in flight at once in process_all_requests
+        self.parallel_steps = parallel_steps  # run plan_steps alongside validate_preset
+        # NDJSON of finished decisions; a re-run restores these instead of reprocessing them
+        self.checkpoint = Path(checkpoint) if checkpoint else None
+        self.resume = resume  # restore from an existing checkpoint instead of starting it over
+        self.failed_ids: List[str] = []  # requests left without a decision by the last run
         self.session: Optional[ClientSession] = None
         self.decisions: List[Decision] = []
         self._stdio_ctx = None  # stdio_client context
+        self._resource_cache: Dict[str, Any] = {}  # uri -> decoded resource, for this session
+        self._reconnect_lock = asyncio.Lock()
+        self._session_gen = 0  # bumped on every connect, so concurrent callers reconnect once
+        # Decisions waiting to be persisted via one `record_decisions` call
+        self._decision_buffer: List[Dict[str, Any]] = []
+        self.decision_batch_size = 64
 
     # ---------- lifecycle ----------
     async def __aenter__(self):
@@ -119,6 +148,7 @@ class MCPAgent:
     async def connect(self):
         """Start the MCP server as a subprocess and create a ClientSession over stdio."""
         logger.info("Connecting to MCP server...")
+        self._session_gen += 1
 
         py = self.python_bin or os.getenv("VIRTUAL_ENV_PY") or "python"
         server_params = StdioServerParameters(
@@ -154,52 +184,131 @@ class MCPAgent:
     async def disconnect(self):
         try:
             if self.session is not None:
+                await self.flush_decisions()
                 await self.session.__aexit__(None, None, None)
         finally:
+            self.session = None
+            self._resource_cache.clear()
             if self._stdio_ctx is not None:
-                await self._stdio_ctx.__aexit__(None, None, None)
+                ctx, self._stdio_ctx = self._stdio_ctx, None
+                await ctx.__aexit__(None, None, None)
             logger.info("Disconnected from MCP server")
 
+    async def _reconnect(self, seen_gen: int) -> None:
+        """Replace a dead session; callers that saw the same dead session reconnect only once."""
+        async with self._reconnect_lock:
+            if self._session_gen != seen_gen:
+                return  # another caller already reconnected
+            logger.warning("MCP session lost; restarting the server")
+            session, ctx = self.session, self._stdio_ctx
+            self.session, self._stdio_ctx = None, None
+            self._resource_cache.clear()
+            for closer in (session, ctx):
+                if closer is not None:
+                    try:
+                        await closer.__aexit__(None, None, None)
+                    except Exception as e:
+                        logger.debug(f"Ignoring error while closing dead session: {e}")
+            await self.connect()
+
     # ---------- low-level wrappers ----------
     async def read_resource(self, uri: str) -> Any:
         assert self.session, "Not connected"
+        # The server is our child process and loads its data once at startup, so a resource
+        # can't change during this session; ReAct steps re-reading it are served from memory
+        if uri in self._resource_cache:
+            return self._resource_cache[uri]
         logger.info(f"Reading MCP resource: {uri}")
-        res = await self.session.read_resource(uri)
-        return json.loads(res.contents[0].text) if res.contents else None
+        gen = self._session_gen
+        try:
+            res = await self.session.read_resource(uri)
+        except self.SESSION_LOST_ERRORS:
+            await self._reconnect(gen)
+            res = await self.session.read_resource(uri)
+        data = _loads(res.contents[0].text) if res.contents else None
+        self._resource_cache[uri] = data
+        return data
 
     async def call_tool(self, name: str, args: Dict[str, Any]) -> Dict[str, Any]:
         assert self.session, "Not connected"
-        logger.info(f"Calling MCP tool: {name} with args: {args}")
+        # Full args can be whole decisions (record_decisions); INFO gets sizes only
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Calling MCP tool: {name} with args: {args}")
+        elif logger.isEnabledFor(logging.INFO):
+            logger.info(f"Calling MCP tool: {name} with args: {summarize_args(args)}")
         # mcp.client.session.call_tool expects a DICT for `arguments`, not a JSON string
-        out = await self.session.call_tool(name, args)
+        gen = self._session_gen
+        try:
+            out = await self.session.call_tool(name, args)
+        except self.SESSION_LOST_ERRORS:
+            await self._reconnect(gen)
+            out = await self.session.call_tool(name, args)
         # Tools return a Content array; our server encodes JSON in the first text block
         text = out.content[0].text if getattr(out, "content", None) else "{}"
         try:
-            return json.loads(text)
+            return _loads(text)
         except Exception:
             return {"raw": text}
 
+    async def call_tools(self, calls: List[tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Run several tools in one `batch_execute` round-trip; results come back in call order."""
+        ops = [{"tool": name, "arguments": args} for name, args in calls]
+        results = await self.call_tool("batch_execute", {"operations": ops})
+        # A failed batch comes back as the server's error text (see call_tool), not a result list
+        if not isinstance(results, list) or len(results) != len(calls):
+            detail = results.get("raw", results) if isinstance(results, dict) else results
+            raise RuntimeError(f"batch_execute returned no per-call results for {[n for n, _ in calls]}: {detail}")
+        out = []
+        for (name, _), item in zip(calls, results):
+            if not isinstance(item, dict) or not item.get("ok"):
+                error = item.get("error") if isinstance(item, dict) else item
+                raise RuntimeError(f"Tool {name} failed: {error}")
+            out.append(item["result"])
+        return out
+
+    # ---------- decision persistence ----------
+    async def record_decision(self, decision: Decision) -> None:
+        """Buffer a decision; the buffer is flushed to the server in bulk."""
+        self._decision_buffer.append({"request_id": decision.request_id, "decision": decision_to_dict(decision)})
+        if len(self._decision_buffer) >= self.decision_batch_size:
+            await self.flush_decisions()
+
+    async def flush_decisions(self) -> None:
+        """Persist all buffered decisions with a single `record_decisions` tool call."""
+        if not self._decision_buffer:
+            return
+        # Swap before awaiting so decisions buffered meanwhile land in the next batch
+        items, self._decision_buffer = self._decision_buffer, []
+        await self.call_tool("record_decisions", {"items": items})
+        logger.info(f"Recorded {len(items)} decisions")
+
     # ---------- deterministic pipeline ----------
     async def process_request(self, request: Dict[str, Any]) -> Decision:
         request_id = request["id"]
+        t0 = time.perf_counter_ns()  # monotonic: processing_time_ms
         trace: List[Dict[str, Any]] = []
 
-        # 1) Validate
-        validation_result = await self.call_tool(
-            "validate_preset", {"request_id": request_id, "account_id": request["account"]}
-        )
-        trace.append({"step": "validate_preset", "result": validation_result, "timestamp": datetime.now().isoformat()})
+        # 1) Validate (+ plan, which is read-only on the server, in the same batch_execute round-trip)
+        validate_args = {"request_id": request_id, "account_id": request["account"]}
+        plan_result: Optional[Dict[str, Any]] = None
+        if self.parallel_steps:
+            validation_result, plan_result = await self.call_tools(
+                [("validate_preset", validate_args), ("plan_steps", {"request_id": request_id})]
+            )
+        else:
+            validation_result = await self.call_tool("validate_preset", validate_args)
+        ts = now_iso()
+        trace.append({"step": "validate_preset", "result": validation_result, "timestamp": ts})
 
         # If validation fails, STOP immediately and return a customer-safe message + clarifying question
         if not validation_result.get("ok", False):
             status = "validation_failed"
-            customer_message = self._customer_message_from_validation(validation_result, request["account"])
-            clarifying_question = self._clarifying_question_from_validation(validation_result)
+            customer_message, clarifying_question = self._classify_validation(validation_result, request["account"])
             rationale = f"Validation failed: {', '.join(validation_result.get('errors', [])) or 'unknown error'}"
 
             decision = Decision(
                 request_id=request_id,
-                decision_id=f"mcp-{request_id}-{int(datetime.now().timestamp())}",
+                decision_id=f"mcp-{request_id}-{int(time.time())}",
                 status=status,
                 rationale=rationale,
                 customer_message=customer_message,
@@ -208,25 +317,28 @@ class MCPAgent:
                 plan={},
                 assignment={},
                 trace=trace,
-                metrics={"processing_time_ms": 0, "agent_type": "MCPAgent"},
-                timestamp=datetime.now().isoformat(),
+                metrics={"processing_time_ms": (time.perf_counter_ns() - t0) // 1_000_000, "agent_type": "MCPAgent"},
+                timestamp=ts,
             )
-            await self.call_tool("record_decision", {"request_id": request_id, "decision": asdict(decision)})
+            await self.record_decision(decision)
             return decision
 
-        # 2) Plan steps (only after validation passes)
-        plan_result = await self.call_tool("plan_steps", {"request_id": request_id})
-        trace.append({"step": "plan_steps", "result": plan_result, "timestamp": datetime.now().isoformat()})
-
-        # 3) Assign artist
-        assignment_result = await self.call_tool("assign_artist", {"request_id": request_id})
-        trace.append({"step": "assign_artist", "result": assignment_result, "timestamp": datetime.now().isoformat()})
+        # 2) Plan + 3) Assign — assign only once validation passes (a failed request needs no artist)
+        if plan_result is None:
+            plan_result, assignment_result = await self.call_tools(
+                [("plan_steps", {"request_id": request_id}), ("assign_artist", {"request_id": request_id})]
+            )
+        else:
+            assignment_result = await self.call_tool("assign_artist", {"request_id": request_id})
+        # One wall-clock read per round-trip; both results arrived together
+        ts = now_iso()
+        trace.append({"step": "plan_steps", "result": plan_result, "timestamp": ts})
+        trace.append({"step": "assign_artist", "result": assignment_result, "timestamp": ts})
 
         # 4) Determine status + messages
         if not validation_result.get("ok", False):
             status = "validation_failed"
-            customer_message = self._customer_message_from_validation(validation_result, request["account"])
-            clarifying_question = self._clarifying_question_from_validation(validation_result)
+            customer_message, clarifying_question = self._classify_validation(validation_result, request["account"])
         elif not assignment_result.get("artist_id"):
             status = "assignment_failed"
             customer_message = "Your request is queued and will be assigned soon."
@@ -240,7 +352,7 @@ class MCPAgent:
 
         decision = Decision(
             request_id=request_id,
-            decision_id=f"mcp-{request_id}-{int(datetime.now().timestamp())}",
+            decision_id=f"mcp-{request_id}-{int(time.time())}",
             status=status,
             rationale=rationale,
             customer_message=customer_message,
@@ -249,153 +361,18 @@ class MCPAgent:
             plan=plan_result,
             assignment=assignment_result,
             trace=trace,
-            metrics={"processing_time_ms": 0, "agent_type": "MCPAgent"},
-            timestamp=datetime.now().isoformat(),
+            metrics={"processing_time_ms": (time.perf_counter_ns() - t0) // 1_000_000, "agent_type": "MCPAgent"},
+            timestamp=ts,
         )
 
-        # Persist via server tool
-        await self.call_tool("record_decision", {"request_id": request_id, "decision": asdict(decision)})
+        # Persist via server tool (buffered, flushed in bulk)
+        await self.record_decision(decision)
         return decision
 
     # ---------- utilities ----------
-    def _parse_validation_errors(self, validation: Dict[str, Any]) -> Dict[str, Any]:
-        """Normalize validator errors into a small taxonomy we can message on.
-        Returns keys like: {missing_channels:["a"], no_packing:True, version_missing:True, engine_missing:True, engine_unsupported:"CryEngine", unsupported_maps:["specular"], topology_quad_only:True, uv_missing:True, uv_overlap:True, size_exceeds:True, polycount_exceeds:True}
-        """
-        errs = [str(e) for e in (validation or {}).get("errors", [])]
-        info: Dict[str, Any] = {
-            "missing_channels": [],
-            "no_packing": False,
-            "version_missing": False,
-            "engine_missing": False,
-            "engine_unsupported": None,
-            "unsupported_maps": [],
-            "map_conflicts": [],
-            "topology_quad_only": False,
-            "uv_missing": False,
-            "uv_overlap": False,
-            "size_exceeds": False,
-            "polycount_exceeds": False,
-        }
-        for e in errs:
-            low = e.lower()
-            # Missing channels
-            if "missing texture channels" in low:
-                parts = e.split(":", 1)
-                if len(parts) == 2:
-                    chans = [c.strip().lower() for c in parts[1].replace(",", " ").split()]
-                    info["missing_channels"] = [c for c in chans if c in {"r","g","b","a"}]
-                else:
-                    info["missing_channels"] = ["r","g","b","a"]
-            # No packing / version
-            if "no texture packing configuration" in low:
-                info["no_packing"] = True
-            if "preset version not specified" in low or ("version" in low and "not" in low and "specified" in low):
-                info["version_missing"] = True
-            # Engine issues
-            if "engine not specified" in low or "missing engine" in low:
-                info["engine_missing"] = True
-            if "unsupported engine" in low or "engine not supported" in low:
-                # try to capture engine name
-                parts = e.split(":", 1)
-                if len(parts) == 2:
-                    info["engine_unsupported"] = parts[1].strip()
-                else:
-                    info["engine_unsupported"] = True
-            # Unsupported or conflicting maps
-            if "unsupported map" in low or "unsupported texture" in low:
-                # e.g., "Unsupported map: specular"
-                parts = e.split(":", 1)
-                if len(parts) == 2:
-                    info["unsupported_maps"].append(parts[1].strip())
-            if "conflicting maps" in low or "map conflict" in low:
-                info["map_conflicts"].append(e)
-            # Topology
-            if "quad only" in low or "quad-only" in low:
-                info["topology_quad_only"] = True
-            # UVs
-            if "missing uvs" in low or "uvs not found" in low:
-                info["uv_missing"] = True
-            if "uv overlap" in low or "overlapping uvs" in low:
-                info["uv_overlap"] = True
-            # Size / polycount limits
-            if "exceeds max texture size" in low or "texture too large" in low:
-                info["size_exceeds"] = True
-            if "exceeds polycount" in low or "polycount too high" in low:
-                info["polycount_exceeds"] = True
-        return info
-
-    def _customer_message_from_validation(self, validation: Dict[str, Any], account: str) -> str:
-        if validation.get("ok"):
-            return ""
-        info = self._parse_validation_errors(validation)
-        errs = validation.get("errors") or []
-
-        # Priority messaging
-        if info.get("no_packing") and info.get("version_missing"):
-            return "Validation error: No texture packing configuration found and no preset version specified. Please add a packing map (e.g., RGBA layout) and set a preset version."
-        if info.get("no_packing"):
-            return "Validation error: No texture packing configuration found. Please provide how channels should be packed (e.g., R: AO, G: Roughness, B: Metallic, A: Emissive)."
-        if info.get("missing_channels"):
-            missing = ", ".join(info["missing_channels"]).upper()
-            return f"Your texture packing is missing channel(s): {missing}. Please include those channels or confirm a default mapping so we can export engine-ready textures."
-        if info.get("unsupported_maps"):
-            maps_str = ", ".join(info["unsupported_maps"]) if info["unsupported_maps"] else "one or more maps"
-            return f"One or more requested texture maps are not supported ({maps_str}). Please remove them or choose supported equivalents."
-        if info.get("map_conflicts"):
-            return "There are conflicting map assignments in your preset. Please resolve duplicate or overlapping map targets before we proceed."
-        if info.get("engine_missing"):
-            return "Target engine is not specified. Please select an engine so we can apply the correct export and validation rules."
-        if info.get("engine_unsupported"):
-            eng = info.get("engine_unsupported")
-            extra = f" ({eng})" if isinstance(eng, str) else ""
-            return f"The selected engine is not supported{extra}. Please choose a supported engine (e.g., Unreal or Unity)."
-        if info.get("topology_quad_only"):
-            return "The preset enforces quad-only topology, but the model doesn't meet this requirement. Please provide a quad-only mesh or relax the topology rule."
-        if info.get("uv_missing"):
-            return "The model is missing UVs. Please include UVs or allow us to auto-unwrap before texturing."
-        if info.get("uv_overlap"):
-            return "The model has overlapping UVs beyond allowed thresholds. Please fix the UVs or permit us to auto-fix with packing."
-        if info.get("size_exceeds"):
-            return "One or more textures exceed the maximum supported size. Please reduce texture dimensions or approve downscaling."
-        if info.get("polycount_exceeds"):
-            return "The mesh exceeds the permitted polycount. Please provide a lower-poly version or allow us to decimate to target."
-
-        # Fallback: join raw errors (safe)
-        return "Validation error: " + "; ".join(str(e) for e in errs)
-
-    def _clarifying_question_from_validation(self, validation: Dict[str, Any]) -> Optional[str]:
-        if validation.get("ok"):
-            return None
-        info = self._parse_validation_errors(validation)
-
-        if info.get("missing_channels"):
-            missing = ", ".join(info["missing_channels"]).upper()
-            return f"We detected missing channel(s) {missing}. Should we apply a default mapping (e.g., map A to emissive) or would you prefer to update your preset first?"
-        if info.get("no_packing"):
-            return "Would you like us to apply a standard packing template (e.g., AO/Roughness/Metallic/Emissive) for this batch, or wait for your custom packing settings?"
-        if info.get("version_missing"):
-            return "Do you want us to assume the latest preset version, or will you specify the version you’re targeting?"
-        if info.get("unsupported_maps"):
-            return "Should we drop the unsupported maps or substitute with supported equivalents (e.g., use ORM instead of separate roughness/metallic)?"
-        if info.get("map_conflicts"):
-            return "Would you like us to auto-resolve the conflicting map assignments using a recommended template, or will you correct the preset?"
-        if info.get("engine_missing"):
-            return "Which engine should we target for export and validation (e.g., Unreal or Unity)?"
-        if info.get("engine_unsupported"):
-            return "Would you like to switch to a supported engine (e.g., Unreal or Unity), or should we stop this batch?"
-        if info.get("topology_quad_only"):
-            return "Should we enforce quad-only by retopologizing automatically, or wait for you to provide a quad-only mesh?"
-        if info.get("uv_missing"):
-            return "Do you want us to auto-unwrap UVs, or will you provide a mesh with UVs?"
-        if info.get("uv_overlap"):
-            return "Should we auto-fix overlapping UVs (may adjust pack/scale), or do you prefer to fix them on your side?"
-        if info.get("size_exceeds"):
-            return "Is it okay if we downscale oversized textures to the nearest supported resolution, or would you like to upload smaller maps?"
-        if info.get("polycount_exceeds"):
-            return "Do you want us to decimate the mesh to the target polycount, or will you provide a lighter model?"
-
-        return "Would you like us to apply sensible defaults now, or wait for your preset update?"
+    def _classify_validation(self, validation: Dict[str, Any], account: str) -> tuple[str, Optional[str]]:
+        """(customer_message, clarifying_question); the taxonomy is shared with the HTTP client."""
+        return classify_validation(validation)
 
     def _rationale_from_parts(
         self,
@@ -418,39 +395,160 @@ class MCPAgent:
         return ", ".join(s) + "."
 
     # ---------- batch ----------
+    @staticmethod
+    def _predict_bin(request: Dict[str, Any], presets: Dict[str, Any]) -> str:
+        """Cheap length guess: requests whose preset will fail validation stop after one tool call."""
+        preset = presets.get(request.get("account"), {})
+        packing = preset.get("packing") or {}
+        complete = "version" in preset and all(ch in packing for ch in ("r", "g", "b", "a"))
+        return "long" if complete else "short"
+
+    def _load_checkpoint(self) -> Dict[str, Decision]:
+        """Decisions saved by an earlier, interrupted run, keyed by request id."""
+        restored: Dict[str, Decision] = {}
+        if not self.checkpoint or not self.checkpoint.exists():
+            return restored
+        if not self.resume:
+            # A leftover file may come from other inputs; only --resume trusts it
+            logger.info(f"Ignoring existing checkpoint {self.checkpoint} (pass --resume to continue from it)")
+            self.checkpoint.unlink()
+            return restored
+        with self.checkpoint.open("r+b") as f:
+            intact = 0
+            for n, line in enumerate(f, 1):
+                if not line.endswith(b"\n"):
+                    break
+                intact += len(line)
+                try:
+                    record = _loads(line)
+                    restored[record["request_id"]] = Decision(**record)
+                except (ValueError, TypeError, KeyError) as e:
+                    logger.warning(f"Skipping corrupt checkpoint line {n} in {self.checkpoint}: {e}")
+            # A crash mid-write leaves at most one torn trailing line; drop it so appends stay line-aligned
+            f.truncate(intact)
+        logger.info(f"Restored {len(restored)} decisions from checkpoint {self.checkpoint}")
+        return restored
+
     async def process_all_requests(self) -> List[Decision]:
         # Get requests from the server resource
         requests = await self.read_resource("resource://requests")
-        logger.info(f"Processing {len(requests)} requests via MCP")
+        restored = self._load_checkpoint()
+        pending = [i for i, r in enumerate(requests) if r["id"] not in restored]
+        logger.info(f"Processing {len(pending)} requests via MCP (concurrency={self.concurrency})")
+
+        # Sliding window: a slot frees as soon as any request finishes, so nothing waits on the
+        # slowest member of a wave. Predicted-long requests start first and the quick validation
+        # failures fill the tail (longest-first keeps the makespan short)
+        presets = await self.read_resource("resource://presets") or {}
+        order = sorted(pending, key=lambda i: self._predict_bin(requests[i], presets) != "long")
+        sem = asyncio.Semaphore(self.concurrency)
+        checkpoint = self.checkpoint.open("ab") if self.checkpoint else None
+        consecutive_failures = 0
+
+        async def _one(i: int) -> Optional[Decision]:
+            nonlocal consecutive_failures
+            async with sem:
+                # Circuit breaker: once the server keeps failing, stop feeding it requests
+                if consecutive_failures >= self.FAILURE_THRESHOLD:
+                    return None
+                try:
+                    decision = await self.process_request(requests[i])
+                except Exception as e:
+                    logger.error(f"Error processing {requests[i].get('id', '?')}: {e}")
+                    consecutive_failures += 1
+                    if consecutive_failures == self.FAILURE_THRESHOLD:
+                        logger.error(f"Circuit open after {consecutive_failures} consecutive failures; skipping remaining requests")
+                    return None
+            consecutive_failures = 0
+            if checkpoint is not None:
+                # One complete line per write, so a crash can only tear the last record
+                checkpoint.write(dump_record(decision_to_dict(decision), indent=False) + b"\n")
+                checkpoint.flush()
+            logger.info(f"Processed {requests[i]['id']}: {decision.status}")
+            return decision
+
+        try:
+            decisions = await asyncio.gather(*(_one(i) for i in order))
+        finally:
+            if checkpoint is not None:
+                checkpoint.close()
+        results: List[Optional[Decision]] = [restored.get(r["id"]) for r in requests]
+        for i, d in zip(order, decisions):
+            results[i] = d
         for r in requests:
-            d = await self.process_request(r)
-            self.decisions.append(d)
-            logger.info(f"Processed {r['id']}: {d.status}")
+            if r["id"] in restored:
+                await self.record_decision(restored[r["id"]])
+
+        # Keep output in resource order regardless of scheduling order
+        self.failed_ids = [r["id"] for r, d in zip(requests, results) if d is None]
+        self.decisions.extend(d for d in results if d is not None)
+        await self.flush_decisions()
         return self.decisions
 
 # -------------------------------
 # ReAct-enabled client
 # -------------------------------
 class LLMEnhancedMCPAgent(MCPAgent):
+    # Canonical tool order; used to speculatively prefetch the next tool while the LLM decides
+    CANONICAL_TOOLS = ("validate_preset", "plan_steps", "assign_artist")
+    SPEC_MIN_SAMPLES = 10      # speculations before the hit rate is trusted
+    SPEC_MIN_HIT_RATE = 0.6    # below this, speculation is switched off
+    # Routing steps emit a tiny JSON action; the finish step also writes rationale/messages
+    DECIDE_MAX_TOKENS = 128
+    FINISH_MAX_TOKENS = 512
+    BATCH_POLL_SECONDS = 30    # --offline: interval between Batch API status checks
+
+    TOOL_SCHEMAS = [
+        # pseudo-tool for resource fetch (client maps to session.read_resource)
+        {"name": "read_resource", "desc": "Read a server resource. Args: {uri: 'resource://requests'|'resource://artists'|'resource://presets'|'resource://rules'}"},
+        # REAL tools (must match server.list_tools() names exactly)
+        {"name": "validate_preset", "desc": "Validate request against customer preset. Args: {request_id: str, account_id: str}"},
+        {"name": "plan_steps", "desc": "Generate processing steps. Args: {request_id: str}"},
+        {"name": "assign_artist", "desc": "Assign to an artist. Args: {request_id: str}"},
+        # virtual control action (client-side only)
+        {"name": "finish", "desc": "Stop and return final decision fields. Args: {status, rationale, customer_message?, clarifying_question?}"},
+    ]
+
     def __init__(
         self,
         *args,
         model: Optional[str] = None,
+        decide_model: Optional[str] = None,
         max_steps: int = 8,
         **kwargs,
     ) -> None:
         super().__init__(*args, **kwargs)
+        # `model` writes the final decision; the cheaper `decide_model` picks the next tool
         self.model = model or os.getenv("OPENAI_MODEL", "gpt-4o-2024-08-06")
+        self.decide_model = decide_model or os.getenv("OPENAI_DECIDE_MODEL", "gpt-4o-mini")
         self.max_steps = max_steps
+        self.speculate = True
+        self._spec_attempts = 0
+        self._spec_hits = 0
+        self._llm_sem = llm_semaphore()
         self.llm_client: Optional[AsyncOpenAI] = None
         if HAS_OPENAI and os.getenv("OPENAI_API_KEY"):
-            self.llm_client = AsyncOpenAI()
+            # One pooled client per agent so concurrent ReAct steps don't contend for connections
+            self.llm_client = AsyncOpenAI(
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+                    timeout=httpx.Timeout(60.0, connect=10.0),
+                    http2=HAS_H2,
+                )
+            )
             logger.info(
-                f"LLM wired: model={self.model} | key_set=True | base_url={os.getenv('OPENAI_BASE_URL','default')}"
+                f"LLM wired: model={self.model} | decide_model={self.decide_model} | key_set=True | base_url={os.getenv('OPENAI_BASE_URL','default')}"
             )
         else:
             logger.info("LLM not available; will fall back to deterministic pipeline per-request.")
 
+    async def disconnect(self):
+        try:
+            await super().disconnect()
+        finally:
+            if self.llm_client is not None:
+                await self.llm_client.close()
+
     # ----- pretty console helpers -----
     def _react_banner(self, request_id: str):
         logger.info("\n\n" + "#"*70 + f"\n\n### LLM ReAct for {request_id} — REASON • ACT • OBSERVE\n\n" + "#"*70 + "\n\n")
@@ -462,6 +560,68 @@ class LLMEnhancedMCPAgent(MCPAgent):
             text = str(payload)
         logger.info(f"\n\n# {title}\n\n{text}\n\n")
 
+    @staticmethod
+    def _summarize_observation(obs: Dict[str, Any]) -> Dict[str, Any]:
+        """Compact view of a tool result for the prompt (flags, counts and IDs only)."""
+        summary: Dict[str, Any] = {}
+        if "ok" in obs:
+            summary["ok"] = obs["ok"]
+        if "errors" in obs:
+            summary["err_count"] = len(obs.get("errors") or [])
+        if "error" in obs:
+            summary["error"] = str(obs["error"])[:200]
+        if "artist_id" in obs:
+            summary["artist_id"] = obs["artist_id"]
+        if "steps" in obs:
+            summary["step_count"] = len(obs.get("steps") or [])
+        if "priority_queue" in obs:
+            summary["priority_queue"] = obs["priority_queue"]
+        return summary
+
+    # ---------- speculative prefetch ----------
+    def _next_canonical_tool(self, observations: List[Dict[str, Any]]) -> Optional[str]:
+        seen = {o["action"] for o in observations}
+        return next((t for t in self.CANONICAL_TOOLS if t not in seen), None)
+
+    def _tool_args(self, tool: str, request: Dict[str, Any]) -> Dict[str, Any]:
+        if tool == "validate_preset":
+            return {"request_id": request["id"], "account_id": request["account"]}
+        return {"request_id": request["id"]}
+
+    def _start_speculation(
+        self, request: Dict[str, Any], observations: List[Dict[str, Any]]
+    ) -> Optional[tuple[str, asyncio.Task]]:
+        """Kick off the next canonical tool call so it runs while the LLM is deciding."""
+        if not self.speculate:
+            return None
+        tool = self._next_canonical_tool(observations)
+        if tool is None:
+            return None
+        task = asyncio.create_task(self.call_tool(tool, self._tool_args(tool, request)))
+        # Retrieve the outcome of discarded tasks so failures aren't reported as unhandled
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return tool, task
+
+    def _claim_speculation(
+        self, speculation: Optional[tuple[str, asyncio.Task]], action_name: Optional[str]
+    ) -> Optional[asyncio.Task]:
+        """Return the prefetched task if the LLM picked the speculated tool; cancel it otherwise."""
+        if speculation is None:
+            return None
+        tool, task = speculation
+        self._spec_attempts += 1
+        if tool == action_name:
+            self._spec_hits += 1
+            return task
+        task.cancel()
+        if (
+            self._spec_attempts >= self.SPEC_MIN_SAMPLES
+            and self._spec_hits / self._spec_attempts < self.SPEC_MIN_HIT_RATE
+        ):
+            self.speculate = False
+            logger.info(f"Speculative prefetch disabled (hit rate {self._spec_hits}/{self._spec_attempts})")
+        return None
+
     # ---------- ReAct loop ----------
     async def process_request(self, request: Dict[str, Any]) -> Decision:
         if not self.llm_client:
@@ -469,6 +629,7 @@ class LLMEnhancedMCPAgent(MCPAgent):
             return await super().process_request(request)
 
         request_id = request["id"]
+        t0 = time.perf_counter_ns()  # monotonic: processing_time_ms
         self._react_banner(request_id)
 
         # Accumulators
@@ -485,23 +646,13 @@ class LLMEnhancedMCPAgent(MCPAgent):
 
         step = 0
 
-        tool_schemas = [
-            # pseudo-tool for resource fetch (client maps to session.read_resource)
-            {"name": "read_resource", "desc": "Read a server resource. Args: {uri: 'resource://requests'|'resource://artists'|'resource://presets'|'resource://rules'}"},
-            # REAL tools (must match server.list_tools() names exactly)
-            {"name": "validate_preset", "desc": "Validate request against customer preset. Args: {request_id: str, account_id: str}"},
-            {"name": "plan_steps", "desc": "Generate processing steps. Args: {request_id: str}"},
-            {"name": "assign_artist", "desc": "Assign to an artist. Args: {request_id: str}"},
-            # virtual control action (client-side only)
-            {"name": "finish", "desc": "Stop and return final decision fields. Args: {status, rationale, customer_message?, clarifying_question?}"},
-        ]
-
         # ReAct
         while step < self.max_steps:
             step += 1
+            speculation = self._start_speculation(request, observations)
             action = await self._llm_decide_next_action(
                 request=request,
-                tool_schemas=tool_schemas,
+                tool_schemas=self.TOOL_SCHEMAS,
                 observations=observations,
             )
 
@@ -510,6 +661,7 @@ class LLMEnhancedMCPAgent(MCPAgent):
 
             action_name = (action or {}).get("action")
             args = (action or {}).get("args", {}) or {}
+            prefetched = self._claim_speculation(speculation, action_name)
 
             if action_name == "read_resource":
                 self._print_block("ACT", {"tool": "read_resource", "args": args})
@@ -521,25 +673,26 @@ class LLMEnhancedMCPAgent(MCPAgent):
                     data = None
                     obs = {"ok": False, "error": str(e), "uri": uri}
                 self._print_block("OBSERVE", obs)
-                observations.append({"action": action_name, "args": args, "observation": obs})
-                trace.append({"step": "read_resource", "result": obs, "timestamp": datetime.now().isoformat()})
+                observations.append({"action": action_name, "args": args, "observation": obs, "summary": self._summarize_observation(obs)})
+                trace.append({"step": "read_resource", "result": obs, "timestamp": now_iso()})
                 logger.info("#"*66)
                 continue
 
             if action_name == "validate_preset":
                 self._print_block("ACT", {"tool": "validate_preset", "args": {"request_id": request_id, "account_id": request["account"]}})
-                res = await self.call_tool("validate_preset", {"request_id": request_id, "account_id": request["account"]})
+                res = await (prefetched or self.call_tool("validate_preset", {"request_id": request_id, "account_id": request["account"]}))
                 validation_result = res or {}
                 self._print_block("OBSERVE", {"ok": validation_result.get("ok"), "errors": validation_result.get("errors"), "preset_version": validation_result.get("preset_version")})
-                observations.append({"action": action_name, "args": {"request_id": request_id}, "observation": validation_result})
-                trace.append({"step": "validate_preset", "result": validation_result, "timestamp": datetime.now().isoformat()})
+                observations.append({"action": action_name, "args": {"request_id": request_id}, "observation": validation_result, "summary": self._summarize_observation(validation_result)})
+                trace.append({"step": "validate_preset", "result": validation_result, "timestamp": now_iso()})
                 logger.info("#"*66)
 
                 # EARLY STOP on validation failure with customer-safe messaging
                 if validation_result.get("ok") is not True:
                     status = "validation_failed"
-                    customer_message = self._customer_message_from_validation(validation_result, request["account"]) or customer_message
-                    clarifying_question = self._clarifying_question_from_validation(validation_result) or clarifying_question
+                    message, question = self._classify_validation(validation_result, request["account"])
+                    customer_message = message or customer_message
+                    clarifying_question = question or clarifying_question
                     rationale = f"Validation failed: {', '.join(validation_result.get('errors', [])) or 'unknown error'}"
                     logger.info("" + "#"*70 + f"### EARLY EXIT — validation_failed for {request_id}" + "#"*70)
                     break
@@ -548,21 +701,21 @@ class LLMEnhancedMCPAgent(MCPAgent):
 
             if action_name == "plan_steps":
                 self._print_block("ACT", {"tool": "plan_steps", "args": {"request_id": request_id}})
-                res = await self.call_tool("plan_steps", {"request_id": request_id})
+                res = await (prefetched or self.call_tool("plan_steps", {"request_id": request_id}))
                 plan_result = res or {}
                 self._print_block("OBSERVE", {"steps": len(plan_result.get("steps", [])), "priority_queue": plan_result.get("priority_queue")})
-                observations.append({"action": action_name, "args": {"request_id": request_id}, "observation": plan_result})
-                trace.append({"step": "plan_steps", "result": plan_result, "timestamp": datetime.now().isoformat()})
+                observations.append({"action": action_name, "args": {"request_id": request_id}, "observation": plan_result, "summary": self._summarize_observation(plan_result)})
+                trace.append({"step": "plan_steps", "result": plan_result, "timestamp": now_iso()})
                 logger.info("#"*66)
                 continue
 
             if action_name == "assign_artist":
                 self._print_block("ACT", {"tool": "assign_artist", "args": {"request_id": request_id}})
-                res = await self.call_tool("assign_artist", {"request_id": request_id})
+                res = await (prefetched or self.call_tool("assign_artist", {"request_id": request_id}))
                 assignment_result = res or {}
                 self._print_block("OBSERVE", {"artist_id": assignment_result.get("artist_id"), "artist_name": assignment_result.get("artist_name"), "score": assignment_result.get("match_score")})
-                observations.append({"action": action_name, "args": {"request_id": request_id}, "observation": assignment_result})
-                trace.append({"step": "assign_artist", "result": assignment_result, "timestamp": datetime.now().isoformat()})
+                observations.append({"action": action_name, "args": {"request_id": request_id}, "observation": assignment_result, "summary": self._summarize_observation(assignment_result)})
+                trace.append({"step": "assign_artist", "result": assignment_result, "timestamp": now_iso()})
                 logger.info("#"*66)
                 continue
 
@@ -573,7 +726,7 @@ class LLMEnhancedMCPAgent(MCPAgent):
                 customer_message = args.get("customer_message")
                 clarifying_question = args.get("clarifying_question")
                 self._print_block("OBSERVE", {"status": status, "has_rationale": bool(rationale)})
-                observations.append({"action": "finish", "args": args, "observation": {"ok": True}})
+                observations.append({"action": "finish", "args": args, "observation": {"ok": True}, "summary": {"ok": True}})
                 logger.info("#"*66)
                 break
 
@@ -582,12 +735,48 @@ class LLMEnhancedMCPAgent(MCPAgent):
             logger.warning(f"Unknown action from LLM: {action}")
             logger.info("#"*66)
 
+        decision = self._build_decision(
+            request,
+            status=status,
+            rationale=rationale,
+            customer_message=customer_message,
+            clarifying_question=clarifying_question,
+            validation_result=validation_result,
+            plan_result=plan_result,
+            assignment_result=assignment_result,
+            trace=trace,
+            steps=step,
+            t0=t0,
+        )
+
+        await self.record_decision(decision)
+        return decision
+
+    def _build_decision(
+        self,
+        request: Dict[str, Any],
+        *,
+        status: Optional[str],
+        rationale: Optional[str],
+        customer_message: Optional[str],
+        clarifying_question: Optional[str],
+        validation_result: Dict[str, Any],
+        plan_result: Dict[str, Any],
+        assignment_result: Dict[str, Any],
+        trace: List[Dict[str, Any]],
+        steps: int,
+        t0: int,
+    ) -> Decision:
+        """Fill in anything the model left unset and assemble the final Decision."""
+        request_id = request["id"]
+
         # If the model didn't explicitly set a status, infer it deterministically
         if not status:
             if validation_result.get("ok") is not True:
                 status = "validation_failed"
-                customer_message = self._customer_message_from_validation(validation_result, request["account"]) or customer_message
-                clarifying_question = self._clarifying_question_from_validation(validation_result) or clarifying_question
+                message, question = self._classify_validation(validation_result, request["account"])
+                customer_message = message or customer_message
+                clarifying_question = question or clarifying_question
             elif not assignment_result.get("artist_id"):
                 status = "assignment_failed"
                 customer_message = customer_message or "Your request is queued and will be assigned soon."
@@ -601,13 +790,13 @@ class LLMEnhancedMCPAgent(MCPAgent):
             status = "success"
 
         # Final outcome banner
-        logger.info("\n\n" + "#"*70 + f"\n\n### FINISH — status={status} | steps={step}\n\n" + "#"*70 + "\n\n")
+        logger.info("\n\n" + "#"*70 + f"\n\n### FINISH — status={status} | steps={steps}\n\n" + "#"*70 + "\n\n")
 
         rationale = rationale or self._rationale_from_parts(request, validation_result, plan_result, assignment_result, status)
 
-        decision = Decision(
+        return Decision(
             request_id=request_id,
-            decision_id=f"mcp-{request_id}-{int(datetime.now().timestamp())}",
+            decision_id=f"mcp-{request_id}-{int(time.time())}",
             status=status,
             rationale=rationale,
             customer_message=customer_message,
@@ -616,24 +805,21 @@ class LLMEnhancedMCPAgent(MCPAgent):
             plan=plan_result or {},
             assignment=assignment_result or {},
             trace=trace,
-            metrics={"processing_time_ms": 0, "agent_type": "LLMEnhancedMCPAgent", "react_steps": step},
-            timestamp=datetime.now().isoformat(),
+            metrics={
+                "processing_time_ms": (time.perf_counter_ns() - t0) // 1_000_000,
+                "agent_type": "LLMEnhancedMCPAgent",
+                "react_steps": steps,
+            },
+            timestamp=now_iso(),
         )
 
-        await self.call_tool("record_decision", {"request_id": request_id, "decision": asdict(decision)})
-        return decision
-
     # ---------- LLM policy ----------
-    async def _llm_decide_next_action(
+    def _decide_messages(
         self,
-        *,
         request: Dict[str, Any],
         tool_schemas: List[Dict[str, Any]],
         observations: List[Dict[str, Any]],
-    ) -> Dict[str, Any]:
-        """Ask the LLM: given the goal and latest observations, choose the next action.
-        Returns a dict like {"action": "validate_preset", "args": {...}} or {"action": "finish", ...}
-        """
+    ) -> List[Dict[str, str]]:
         sys_msg = (
             "You are a routing agent for 3D asset requests. "
             "Use the available tools to validate presets, plan steps, assign artists, and then FINISH. "
@@ -642,7 +828,8 @@ class LLMEnhancedMCPAgent(MCPAgent):
         goal = {
             "request": request,
             "tools": tool_schemas,
-            "observations": observations[-6:],  # keep prompt small
+            # compact summaries only; full results stay in the trace
+            "observations": [{"action": o["action"], "summary": o["summary"]} for o in observations[-6:]],
             "instructions": [
                 "Typical order: validate_preset -> plan_steps -> assign_artist -> finish.",
                 "If validation fails, finish with status='validation_failed' and a clear rationale.",
@@ -650,23 +837,48 @@ class LLMEnhancedMCPAgent(MCPAgent):
                 "Use read_resource only when you truly need more context.",
             ],
         }
+        return [
+            {"role": "system", "content": sys_msg},
+            {"role": "user", "content": json.dumps(goal)},
+        ]
+
+    @staticmethod
+    def _parse_action(content: Optional[str]) -> Dict[str, Any]:
+        content = (content or "{}").strip()
+        # model may wrap in code fences; strip gently
+        if content.startswith("```"):
+            content = content.strip("`\n ")
+            if content.lower().startswith("json"):
+                content = content[4:].lstrip()  # remove leading 'json'
+        return json.loads(content)
+
+    async def _llm_decide_next_action(
+        self,
+        *,
+        request: Dict[str, Any],
+        tool_schemas: List[Dict[str, Any]],
+        observations: List[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        """Ask the LLM: given the goal and latest observations, choose the next action.
+        Returns a dict like {"action": "validate_preset", "args": {...}} or {"action": "finish", ...}
+        """
+        # Only the finish step (all canonical tools observed) needs the larger model
+        finishing = self._next_canonical_tool(observations) is None
+        limits: Dict[str, Any] = (
+            {"max_tokens": self.FINISH_MAX_TOKENS}
+            if finishing
+            else {"max_tokens": self.DECIDE_MAX_TOKENS, "stop": ["\n\n"]}
+        )
 
         try:
-            resp = await self.llm_client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": sys_msg},
-                    {"role": "user", "content": json.dumps(goal)},
-                ],
-                temperature=0.0,
-            )
-            content = (resp.choices[0].message.content or "{}").strip()
-            # model may wrap in code fences; strip gently
-            if content.startswith("```"):
-                content = content.strip("`\n ")
-                if content.lower().startswith("json"):
-                    content = content[4:].lstrip()  # remove leading 'json'
-            return json.loads(content)
+            async with self._llm_sem:
+                resp = await self.llm_client.chat.completions.create(
+                    model=self.model if finishing else self.decide_model,
+                    messages=self._decide_messages(request, tool_schemas, observations),
+                    temperature=0.0,
+                    **limits,
+                )
+            return self._parse_action(resp.choices[0].message.content)
         except Exception as e:
             logger.exception(f"LLM decide_next_action error: {e}")
             # Minimal safe fallback: continue the canonical flow
@@ -682,6 +894,132 @@ class LLMEnhancedMCPAgent(MCPAgent):
                 return {"action": "assign_artist", "args": {"request_id": request["id"]}}
             return {"action": "finish", "args": {"status": "completed", "rationale": "Fallback finish after error."}}
 
+    # ---------- offline (Batch API) ----------
+    async def _preplan(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Run the canonical tools deterministically, stopping early on validation failure."""
+        state: Dict[str, Any] = {
+            "t0": time.perf_counter_ns(),
+            "observations": [], "trace": [], "validate_preset": {}, "plan_steps": {}, "assign_artist": {},
+        }
+        for tool in self.CANONICAL_TOOLS:
+            res = await self.call_tool(tool, self._tool_args(tool, request)) or {}
+            state[tool] = res
+            state["observations"].append({"action": tool, "args": {"request_id": request["id"]}, "observation": res, "summary": self._summarize_observation(res)})
+            state["trace"].append({"step": tool, "result": res, "timestamp": now_iso()})
+            if tool == "validate_preset" and res.get("ok") is not True:
+                break
+        return state
+
+    async def _run_batch(self, lines: List[Dict[str, Any]], batch_path: Path) -> Dict[str, Dict[str, Any]]:
+        """Submit finish prompts through the OpenAI Batch API and return parsed actions by custom_id."""
+        with batch_path.open("w") as f:
+            for line in lines:
+                f.write(json.dumps(line) + "\n")
+        with batch_path.open("rb") as f:
+            upload = await self.llm_client.files.create(file=f, purpose="batch")
+        batch = await self.llm_client.batches.create(
+            input_file_id=upload.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+        logger.info(f"Submitted batch {batch.id} with {len(lines)} requests ({batch_path})")
+
+        while batch.status not in {"completed", "failed", "expired", "cancelled"}:
+            await asyncio.sleep(self.BATCH_POLL_SECONDS)
+            batch = await self.llm_client.batches.retrieve(batch.id)
+            logger.info(f"Batch {batch.id}: {batch.status}")
+
+        actions: Dict[str, Dict[str, Any]] = {}
+        if batch.status != "completed" or not batch.output_file_id:
+            logger.warning(f"Batch {batch.id} ended as {batch.status}; falling back to deterministic decisions")
+            return actions
+
+        # A bad output line only costs its own request, which falls back to a deterministic decision
+        submitted = {line["custom_id"] for line in lines}
+        output = await self.llm_client.files.content(batch.output_file_id)
+        for n, raw in enumerate(output.text.splitlines(), 1):
+            if not raw.strip():
+                continue
+            try:
+                item = json.loads(raw)
+                custom_id = item.get("custom_id")
+            except (ValueError, AttributeError) as e:
+                logger.warning(f"Batch {batch.id}: skipping malformed output line {n}: {e}")
+                continue
+            if custom_id not in submitted:
+                logger.warning(f"Batch {batch.id}: skipping output line {n} with unknown custom_id {custom_id!r}")
+                continue
+            try:
+                body = item["response"]["body"]
+                actions[custom_id] = self._parse_action(body["choices"][0]["message"]["content"])
+            except Exception as e:
+                logger.warning(f"Unusable batch result for {custom_id}: {e}")
+        missing = submitted - actions.keys()
+        if missing:
+            logger.warning(f"Batch {batch.id}: no usable result for {sorted(missing)}; using deterministic decisions")
+        return actions
+
+    async def process_all_requests_offline(self, batch_path: str | Path = "batch.jsonl") -> List[Decision]:
+        """Offline run: tools execute locally, finish calls go through the Batch API.
+
+        Each request is driven deterministically up to its first LLM step (finish),
+        those prompts are submitted as one batch, and every response is replayed as
+        the finish action. Requests that fail validation never reach the model.
+        """
+        if not self.llm_client:
+            return await self.process_all_requests()
+
+        requests = await self.read_resource("resource://requests")
+        states: List[Dict[str, Any]] = []
+        for start in range(0, len(requests), self.batch_size):
+            wave = requests[start:start + self.batch_size]
+            states.extend(await asyncio.gather(*(self._preplan(r) for r in wave)))
+
+        lines = [
+            {
+                "custom_id": request["id"],
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": self.model,
+                    "messages": self._decide_messages(request, self.TOOL_SCHEMAS, state["observations"]),
+                    "temperature": 0.0,
+                    "max_tokens": self.FINISH_MAX_TOKENS,
+                },
+            }
+            for request, state in zip(requests, states)
+            if state["validate_preset"].get("ok") is True
+        ]
+        actions = await self._run_batch(lines, Path(batch_path)) if lines else {}
+
+        for request, state in zip(requests, states):
+            validation_result = state["validate_preset"]
+            finish_args: Dict[str, Any] = {}
+            action = actions.get(request["id"]) or {}
+            if validation_result.get("ok") is not True:
+                # Same wording as the online early exit
+                finish_args = {"rationale": f"Validation failed: {', '.join(validation_result.get('errors', [])) or 'unknown error'}"}
+            elif action.get("action") == "finish":
+                finish_args = action.get("args") or {}
+            decision = self._build_decision(
+                request,
+                status=finish_args.get("status"),
+                rationale=finish_args.get("rationale"),
+                customer_message=finish_args.get("customer_message"),
+                clarifying_question=finish_args.get("clarifying_question"),
+                validation_result=validation_result,
+                plan_result=state["plan_steps"],
+                assignment_result=state["assign_artist"],
+                trace=state["trace"],
+                steps=len(state["observations"]),
+                t0=state["t0"],
+            )
+            self.decisions.append(decision)
+            await self.record_decision(decision)
+
+        await self.flush_decisions()
+        return self.decisions
+
 # -------------------------------
 # CLI
 # -------------------------------
@@ -697,30 +1035,49 @@ async def main():
     parser.add_argument("--python-bin", type=str, default=None)
     parser.add_argument("--agent-type", type=str, default="mcp", choices=["mcp", "llm"])  # deterministic vs ReAct
     parser.add_argument("--max-steps", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=8)  # requests pre-planned concurrently per offline wave
+    parser.add_argument("--concurrency", type=int, default=16)  # requests in flight at once
+    parser.add_argument("--decide-model", type=str, default=None)  # small model for ReAct routing steps
+    parser.add_argument("--offline", action="store_true")  # llm only: submit finish prompts via the Batch API
     parser.add_argument("--output", type=str, default="decisions.json")
+    parser.add_argument("--resume", action="store_true")  # continue from <output>.partial of an interrupted run
 
     args = parser.parse_args()
+    if args.offline and args.agent_type != "llm":
+        parser.error("--offline requires --agent-type llm")
 
     # The server reads its own data dir; we only pass it along on spawn
     data_dir = Path(args.requests).parent
 
     AgentCls = MCPAgent if args.agent_type == "mcp" else LLMEnhancedMCPAgent
 
+    checkpoint = Path(args.output + ".partial")
     agent = AgentCls(
         data_dir=data_dir,
         server_script=args.server_script,
         python_bin=args.python_bin,
         agent_type=args.agent_type,
         max_steps=args.max_steps,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        decide_model=args.decide_model,
+        checkpoint=checkpoint,
+        resume=args.resume,
     )
 
     await agent.connect()
-    decisions = await agent.process_all_requests()
+    if args.offline:
+        decisions = await agent.process_all_requests_offline(Path(args.output).with_name("batch.jsonl"))
+    else:
+        decisions = await agent.process_all_requests()
     await agent.disconnect()
 
     # Save results
-    with open(args.output, "w") as f:
-        json.dump([asdict(d) for d in decisions], f, indent=2)
+    write_decisions(args.output, decisions)
+    if agent.failed_ids:
+        logger.warning(f"{len(agent.failed_ids)} requests without a decision; re-run with --resume to continue from {checkpoint}")
+    else:
+        checkpoint.unlink(missing_ok=True)
 
     # Summary (robust to synonyms)
     print(f"\n{'='*60}")
@@ -734,12 +1091,18 @@ async def main():
         # Fallback to validation_result.ok if status is unknown
         return bool((d.validation_result or {}).get("ok")) and bool((d.assignment or {}).get("artist_id"))
 
-    successes = sum(1 for d in decisions if _is_success(d))
+    # One pass for both the success tally and the per-status breakdown
+    by_status: Counter = Counter()
+    successes = 0
+    for d in decisions:
+        by_status[d.status] += 1
+        successes += _is_success(d)
     print(f"Requests processed: {len(decisions)}")
     print(f"Successful: {successes}")
     print(f"Failed: {len(decisions) - successes}")
+    print("By status: " + ", ".join(f"{status}={n}" for status, n in by_status.most_common()))
     print(f"\nResults saved to: {args.output}")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    run_async(main())
@@ -17,13 +17,17 @@ This mirrors run_agent.py behavior:
 from __future__ import annotations
 
 import asyncio
+import itertools
 import json
 import logging
 import os
-from dataclasses import asdict, dataclass
+import random
+import re
+import time
+from collections import Counter
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 # -------------------------------
 # Optional .env support
@@ -36,6 +40,52 @@ except Exception:
 
 import httpx
 
+from mcp_common import (
+    Decision, DecisionWriter, classify_validation, decision_to_dict, llm_semaphore, now_iso, run_async, summarize_args,
+)
+
+try:
+    import h2  # noqa: F401  (lets httpx negotiate HTTP/2)
+    HAS_H2 = True
+except Exception:
+    HAS_H2 = False
+
+# -------------------------------
+# Optional fast JSON encoder/decoder
+# -------------------------------
+try:
+    import orjson
+    HAS_ORJSON = True
+except Exception:
+    HAS_ORJSON = False
+
+_loads = orjson.loads if HAS_ORJSON else json.loads  # accepts the raw response bytes either way
+
+
+def _dumps(obj: Any, *, indent: bool = False) -> str:
+    if HAS_ORJSON:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, option=option).decode("utf-8")
+    return json.dumps(obj, indent=2 if indent else None)
+
+# -------------------------------
+# Optional msgpack request bodies
+# -------------------------------
+try:
+    import msgpack
+    HAS_MSGPACK = True
+except Exception:
+    HAS_MSGPACK = False
+
+# -------------------------------
+# Optional WebSocket tool transport
+# -------------------------------
+try:
+    import websockets
+    HAS_WEBSOCKETS = True
+except Exception:
+    HAS_WEBSOCKETS = False
+
 # -------------------------------
 # Optional LLM integration
 # -------------------------------
@@ -54,23 +104,57 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# -------------------------------
-# Data classes
-# -------------------------------
-@dataclass
-class Decision:
-    request_id: str
-    decision_id: str
-    status: str  # 'success' | 'validation_failed' | 'assignment_failed'
-    rationale: Optional[str]
-    customer_message: Optional[str]
-    clarifying_question: Optional[str]
-    validation_result: Dict[str, Any]
-    plan: Dict[str, Any]
-    assignment: Dict[str, Any]
-    trace: List[Dict[str, Any]]
-    metrics: Dict[str, Any]
-    timestamp: str
+class _WsTransport:
+    """Tool calls multiplexed over one WebSocket.
+
+    Each frame carries an incrementing id; a background reader resolves the matching future,
+    so any number of calls can be in flight on the connection at once.
+    """
+
+    def __init__(self, timeout: float = 60.0):
+        self.timeout = timeout  # per call, like the HTTP client's read timeout
+        self._ws = None
+        self._reader: Optional[asyncio.Task] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+
+    async def connect(self, url: str, headers: Dict[str, str]) -> None:
+        self._ws = await websockets.connect(url, additional_headers=headers, max_size=None)
+        self._reader = asyncio.create_task(self._read_loop())
+
+    async def _read_loop(self) -> None:
+        err: BaseException = ConnectionError("WebSocket closed")
+        try:
+            async for frame in self._ws:
+                reply = _loads(frame)
+                fut = self._pending.pop(reply.get("id"), None)
+                if fut is not None and not fut.done():
+                    fut.set_result(reply)
+        except Exception as e:
+            err = ConnectionError(f"WebSocket closed: {e}")
+        # Nothing else will answer these calls
+        for fut in self._pending.values():
+            if not fut.done():
+                fut.set_exception(err)
+        self._pending.clear()
+
+    async def call(self, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        if self._reader is None or self._reader.done():
+            raise ConnectionError("WebSocket transport is closed")
+        call_id = next(self._ids)
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[call_id] = fut
+        try:
+            await self._ws.send(_dumps({"id": call_id, "name": name, "arguments": arguments}))
+            return await asyncio.wait_for(fut, self.timeout)
+        finally:
+            self._pending.pop(call_id, None)
+
+    async def close(self) -> None:
+        if self._ws is not None:
+            await self._ws.close()
+        if self._reader is not None:
+            await asyncio.gather(self._reader, return_exceptions=True)
 
 # =========================================================
 # MCPAgent — HTTP client
@@ -78,17 +162,52 @@ class Decision:
 class MCPAgent:
     """Agent that connects to the MCP HTTP server, calls its tools, and records decisions."""
 
+    # base_url -> {"tools": [...], "resources": [...]}; discovery is debug-only and stable per server
+    _discovery_cache: Dict[str, Dict[str, List[str]]] = {}
+
+    # Transient-failure retries (see _send). record_decision(s) appends, so only the read-only tools
+    # (assign_artist reserves no capacity) are retried once a request may have hit the server.
+    HTTP_MAX_ATTEMPTS = 3
+    RETRY_BASE_DELAY = 0.1
+    RETRY_MAX_DELAY = 2.0
+    RETRY_STATUS_CODES = frozenset({502, 503, 504})
+    IDEMPOTENT_TOOLS = frozenset({"validate_preset", "plan_steps", "assign_artist", "process_request"})
+    # Tools whose arguments carry whole decisions; sent as msgpack when available
+    MSGPACK_TOOLS = frozenset({"record_decision", "record_decisions", "record_decisions_delta"})
+    # Decision fields the server rebuilds from the trace (see record_decision)
+    DELTA_OMITTED_FIELDS = frozenset({"request_id", "validation_result", "plan", "assignment"})
+    # Resources are static for a server's lifetime today; the TTL bounds staleness if that changes
+    RESOURCE_TTL = 60.0
+
     def __init__(
         self,
         base_url: str | None = None,
         data_dir: Path = Path("data"),   # server reads its own dir; we keep this for parity
         api_token: Optional[str] = None,  # if server has MCP_HTTP_TOKEN set
+        concurrency: int = 8,             # requests in flight at once in process_all_requests
+        parallel_steps: bool = True,      # send validate_preset and plan_steps in one batch
+        discover: bool = False,           # list /tools and /resources on connect
+        transport: str = "http",          # "ws": multiplex tool calls over one WebSocket if offered
+        fine_grained: bool = False,       # call each tool separately even if the server has process_request
     ):
         self.base_url = base_url or os.getenv("MCP_HTTP_BASE_URL", "http://127.0.0.1:8765")
         self.api_token = api_token or os.getenv("MCP_HTTP_TOKEN")
         self.client: Optional[httpx.AsyncClient] = None
         self.decisions: List[Decision] = []
         self.data_dir = Path(data_dir)
+        self.concurrency = max(1, concurrency)
+        self.parallel_steps = parallel_steps
+        self.discover = discover
+        self.transport = transport
+        self.fine_grained = fine_grained
+        self._server_fused = False  # set from /initialize capabilities
+        self._server_delta = False
+        self._ws: Optional[_WsTransport] = None
+        self._resource_cache: Dict[str, tuple[float, Any]] = {}  # uri -> (fetched_at monotonic, data)
+        self._requests_index: tuple[Any, Dict[str, Dict[str, Any]]] = (None, {})  # (source list, id -> request)
+        # Decisions waiting to be persisted via one `record_decisions` call
+        self._decision_buffer: List[Dict[str, Any]] = []
+        self.decision_batch_size = 64
 
     # ---------- pretty console helpers ----------
     def _print_header(self, title: str) -> None:
@@ -96,7 +215,10 @@ class MCPAgent:
         logger.info("\n%s\n### %s\n%s", bar, title, bar)
 
     def _print_block(self, label: str, data: Any) -> None:
-        body = json.dumps(data, indent=2) if not isinstance(data, str) else data
+        # Pretty-printing runs per ReAct step; skip it entirely when INFO is filtered out
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        body = _dumps(data, indent=True) if not isinstance(data, str) else data
         logger.info("\n# %s\n%s\n", label, body)
 
     # ---------- lifecycle ----------
@@ -109,41 +231,145 @@ class MCPAgent:
 
     async def connect(self):
         """Connect (create HTTP client and perform initialize handshake)."""
-        headers = {}
+        # Ask for native tool results so call_tool can skip the inner JSON parse (see _unwrap_content)
+        headers = {"X-Client-Prefers-Data": "1"}
         if self.api_token:
             headers["Authorization"] = f"Bearer {self.api_token}"
-        self.client = httpx.AsyncClient(base_url=self.base_url, headers=headers, timeout=60.0)
+        # Sized for the concurrent fan-out; HTTP/2 multiplexes tool calls over one connection.
+        # No transport-level retries: _send is the only retry layer, so attempts don't multiply.
+        limits = httpx.Limits(
+            max_connections=int(os.getenv("MCP_HTTP_MAX_CONNECTIONS", "200")),
+            max_keepalive_connections=int(os.getenv("MCP_HTTP_KEEPALIVE", "100")),
+            keepalive_expiry=30.0,
+        )
+        timeout = httpx.Timeout(60.0, connect=10.0)
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers=headers,
+            timeout=timeout,
+            transport=httpx.AsyncHTTPTransport(limits=limits, http2=HAS_H2),
+        )
         logger.info(f"Connecting to MCP HTTP server at {self.base_url} ...")
         resp = await self.client.post("/initialize")
         resp.raise_for_status()
-        info = resp.json()
+        info = _loads(resp.content)
         logger.info(f"Connected: {info.get('server_name')} v{info.get('server_version')}")
-
-        # Optional: list tools/resources for debug
-        tools = (await self.client.get("/tools")).json()["tools"]
-        logger.info(f"Available tools: {[t['name'] for t in tools]}")
-        resources = (await self.client.get("/resources")).json()["resources"]
-        logger.info(f"Available resources: {[r['uri'] for r in resources]}")
+        self._server_fused = bool(info.get("capabilities", {}).get("process_request"))
+        self._server_delta = bool(info.get("capabilities", {}).get("record_decision_delta"))
+
+        if self.transport == "ws":
+            if not HAS_WEBSOCKETS:
+                logger.warning("websockets is not installed; tool calls will use HTTP")
+            elif "ws" not in info.get("transports", []):
+                logger.warning("Server does not offer WebSocket tool calls; tool calls will use HTTP")
+            else:
+                ws = _WsTransport(timeout=timeout.read)
+                await ws.connect(re.sub(r"^http", "ws", self.base_url.rstrip("/")) + "/ws", headers)
+                self._ws = ws
+                logger.info("Tool calls multiplexed over WebSocket")
+
+        # Optional: list tools/resources for debug (once per server URL)
+        if self.discover or logger.isEnabledFor(logging.DEBUG):
+            listing = MCPAgent._discovery_cache.get(self.base_url)
+            if listing is None:
+                tools = _loads((await self.client.get("/tools")).content)["tools"]
+                resources = _loads((await self.client.get("/resources")).content)["resources"]
+                listing = {"tools": [t["name"] for t in tools], "resources": [r["uri"] for r in resources]}
+                MCPAgent._discovery_cache[self.base_url] = listing
+            logger.info("Available tools: %s", listing["tools"])
+            logger.info("Available resources: %s", listing["resources"])
 
     async def disconnect(self):
         if self.client:
+            await self.flush_decisions()
+            if self._ws is not None:
+                await self._ws.close()
+                self._ws = None
             await self.client.aclose()
             self.client = None
         logger.info("Disconnected from MCP HTTP server")
 
     # ---------- HTTP calls ----------
+    async def _send(self, method: str, url: str, *, idempotent: bool = True, **kwargs: Any) -> bytes:
+        """Send a request and return the raw body, retrying transient failures with jittered backoff.
+
+        Anything that may have reached the server (timeouts, dropped connections, 5xx) is only
+        retried for idempotent calls; connect failures are always safe to retry.
+        """
+        for attempt in range(1, self.HTTP_MAX_ATTEMPTS + 1):
+            last = attempt == self.HTTP_MAX_ATTEMPTS
+            try:
+                async with self.client.stream(method, url, **kwargs) as resp:
+                    if idempotent and not last and resp.status_code in self.RETRY_STATUS_CODES:
+                        logger.warning(f"{method} {url} -> {resp.status_code}; retrying ({attempt}/{self.HTTP_MAX_ATTEMPTS})")
+                    else:
+                        resp.raise_for_status()
+                        return await resp.aread()
+            except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                if last:
+                    raise
+                logger.warning(f"{method} {url} failed to connect: {e}; retrying ({attempt}/{self.HTTP_MAX_ATTEMPTS})")
+            except (httpx.ReadTimeout, httpx.RemoteProtocolError) as e:
+                if last or not idempotent:
+                    raise
+                logger.warning(f"{method} {url} failed: {e!r}; retrying ({attempt}/{self.HTTP_MAX_ATTEMPTS})")
+            delay = min(self.RETRY_MAX_DELAY, self.RETRY_BASE_DELAY * 2 ** (attempt - 1))
+            await asyncio.sleep(delay + random.uniform(0, self.RETRY_BASE_DELAY))
+        raise RuntimeError("unreachable")
+
     async def call_tool(self, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
         if not self.client:
             raise RuntimeError("Not connected to MCP HTTP server")
-        logger.info(f"Calling MCP tool: {tool_name} with args: {arguments}")
-        resp = await self.client.post("/call_tool", json={"name": tool_name, "arguments": arguments})
-        resp.raise_for_status()
-        payload = resp.json()
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Calling MCP tool: %s with args: %s", tool_name, summarize_args(arguments))
+        if self._ws is not None:
+            return self._check_result(tool_name, await self._ws.call(tool_name, arguments))
+        request_body: Dict[str, Any] = {"json": {"name": tool_name, "arguments": arguments}}
+        if HAS_MSGPACK and tool_name in self.MSGPACK_TOOLS:
+            # Trace-heavy decision payloads: smaller and faster to encode than JSON
+            request_body = {
+                "content": msgpack.packb({"name": tool_name, "arguments": arguments}, use_bin_type=True),
+                "headers": {"Content-Type": "application/msgpack"},
+            }
+        body = await self._send(
+            "POST", "/call_tool",
+            idempotent=tool_name in self.IDEMPOTENT_TOOLS,
+            **request_body,
+        )
+        return self._unwrap_content(_loads(body))
+
+    async def call_tools(self, calls: List[tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Run several tools in one round-trip (POST /call_tools, or the WebSocket); results keep call order."""
+        if not self.client:
+            raise RuntimeError("Not connected to MCP HTTP server")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Calling MCP tools: %s", [name for name, _ in calls])
+        if self._ws is not None:
+            # Already multiplexed: every call goes out at once on the socket
+            payloads = await asyncio.gather(*(self._ws.call(name, arguments) for name, arguments in calls))
+        else:
+            body = await self._send(
+                "POST", "/call_tools",
+                idempotent=all(name in self.IDEMPOTENT_TOOLS for name, _ in calls),
+                json={"calls": [{"name": name, "arguments": arguments} for name, arguments in calls]},
+            )
+            payloads = _loads(body)["results"]
+        return [self._check_result(name, payload) for (name, _), payload in zip(calls, payloads)]
+
+    def _check_result(self, name: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if payload.get("isError"):
+            raise RuntimeError(f"Tool {name} failed ({payload.get('status_code')}): {payload.get('detail')}")
+        return self._unwrap_content(payload)
+
+    @staticmethod
+    def _unwrap_content(payload: Dict[str, Any]) -> Dict[str, Any]:
+        if "data" in payload:
+            return payload["data"]  # server honoured X-Client-Prefers-Data: already decoded
         content = payload.get("content", [])
         if content:
             # our server returns JSON in first text block
             try:
-                return json.loads(content[0]["text"])  # type: ignore[index]
+                return _loads(content[0]["text"])  # type: ignore[index]
             except Exception:
                 return {"raw": content[0].get("text")}
         return {}
@@ -151,53 +377,158 @@ class MCPAgent:
     async def read_resource(self, uri: str) -> Any:
         if not self.client:
             raise RuntimeError("Not connected to MCP HTTP server")
-        logger.info(f"Reading MCP resource: {uri}")
-        resp = await self.client.get("/resource", params={"uri": uri})
-        resp.raise_for_status()
-        return resp.json()
+        hit = self._resource_cache.get(uri)
+        if hit is not None and time.monotonic() - hit[0] < self.RESOURCE_TTL:
+            return hit[1]
+        logger.info("Reading MCP resource: %s", uri)
+        data = _loads(await self._send("GET", "/resource", params={"uri": uri}))
+        self._resource_cache[uri] = (time.monotonic(), data)
+        return data
+
+    # ---------- decision persistence ----------
+    async def record_decision(self, decision: Decision) -> None:
+        """Buffer a decision; the buffer is flushed to the server in bulk.
+
+        Servers that accept deltas get the decision without validation_result/plan/assignment:
+        those are the trace's tool results, so sending them again roughly doubles the payload.
+        """
+        record = decision_to_dict(decision)
+        if self._server_delta:
+            delta = {k: v for k, v in record.items() if k not in self.DELTA_OMITTED_FIELDS}
+            self._decision_buffer.append({"request_id": decision.request_id, "delta": delta})
+        else:
+            self._decision_buffer.append({"request_id": decision.request_id, "decision": record})
+        if len(self._decision_buffer) >= self.decision_batch_size:
+            await self.flush_decisions()
+
+    async def flush_decisions(self) -> None:
+        """Persist all buffered decisions with a single `record_decisions(_delta)` tool call."""
+        if not self._decision_buffer:
+            return
+        # Swap before awaiting so decisions buffered meanwhile land in the next batch
+        items, self._decision_buffer = self._decision_buffer, []
+        tool = "record_decisions_delta" if "delta" in items[0] else "record_decisions"
+        await self.call_tool(tool, {"items": items})
+        logger.info(f"Recorded {len(items)} decisions")
 
     # ---------- core processing ----------
-    async def process_all_requests(self) -> List[Decision]:
+    async def _fetch_request(self, request_id: str) -> Dict[str, Any]:
+        requests = await self.read_resource("resource://requests")
+        # Index once per fetched list (read_resource serves the same object until the TTL expires)
+        if self._requests_index[0] is not requests:
+            self._requests_index = (requests, {r["id"]: r for r in requests})
+        request = self._requests_index[1].get(request_id)
+        if not request:
+            raise ValueError(f"Request {request_id} not found")
+        return request
+
+    async def _iter_indexed(self, ordered: bool = False) -> AsyncIterator[Tuple[int, Decision]]:
+        """Yield (resource index, decision) pairs as requests finish, then flush recorded decisions.
+
+        With `ordered`, early finishers wait in a reorder buffer keyed by index and pairs come out
+        in resource order; requests that failed are skipped either way.
+        """
         requests = await self.read_resource("resource://requests")
         if not requests:
             logger.warning("No requests found")
-            return []
-
-        logger.info(f"Processing {len(requests)} requests via MCP HTTP")
-        for req in requests:
+            return
+
+        logger.info(f"Processing {len(requests)} requests via MCP HTTP (concurrency={self.concurrency})")
+        # Bounded producer/consumer: `concurrency` workers pull from a small queue, so only
+        # a handful of coroutines exist at a time however many requests there are
+        workers = min(self.concurrency, len(requests))
+        queue: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+        done: asyncio.Queue = asyncio.Queue()
+
+        async def _produce() -> None:
+            for item in enumerate(requests):
+                await queue.put(item)
+            for _ in range(workers):
+                await queue.put(None)  # one stop sentinel per worker
+
+        async def _consume() -> None:
             try:
-                # Loud banner per request
-                self._print_header(f"LLM ReAct for {req['id']} — REASON • ACT • OBSERVE")
-                decision = await self.process_request(req["id"])
-                self.decisions.append(decision)
-                logger.info(f"Processed {req['id']}: {decision.status}")
-            except Exception as e:
-                logger.error(f"Error processing {req.get('id', '?')}: {e}")
+                while (item := await queue.get()) is not None:
+                    i, req = item
+                    try:
+                        # Loud banner per request
+                        self._print_header(f"LLM ReAct for {req['id']} — REASON • ACT • OBSERVE")
+                        decision = await self.process_request(req["id"], request=req)
+                        logger.info(f"Processed {req['id']}: {decision.status}")
+                        await done.put((i, decision))
+                    except Exception as e:
+                        logger.error(f"Error processing {req.get('id', '?')}: {e}")
+                        await done.put((i, None))  # frees the slot for the reorder buffer
+            finally:
+                await done.put(None)  # this worker is finished
+
+        tasks = [asyncio.create_task(_produce())] + [asyncio.create_task(_consume()) for _ in range(workers)]
+        pending: Dict[int, Optional[Decision]] = {}  # finished ahead of `next_i` (ordered only)
+        next_i = 0
+        try:
+            running = workers
+            while running:
+                item = await done.get()
+                if item is None:
+                    running -= 1
+                elif not ordered:
+                    if item[1] is not None:
+                        yield item
+                else:
+                    pending[item[0]] = item[1]
+                    while next_i in pending:
+                        decision = pending.pop(next_i)
+                        if decision is not None:
+                            yield next_i, decision
+                        next_i += 1
+        finally:
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        await self.flush_decisions()
+
+    async def iter_decisions(self, ordered: bool = False) -> AsyncIterator[Decision]:
+        """Yield each Decision as soon as it completes, or in resource order with `ordered`."""
+        async for _, decision in self._iter_indexed(ordered):
+            yield decision
+
+    async def process_all_requests(self) -> List[Decision]:
+        # Resource order, so decisions.json matches resource://requests
+        self.decisions.extend([d async for d in self.iter_decisions(ordered=True)])
         return self.decisions
 
     # Default “dumb” pipeline (used by plain MCPAgent subclasses if needed)
-    async def process_request(self, request_id: str) -> Decision:
+    async def process_request(self, request_id: str, request: Optional[Dict[str, Any]] = None) -> Decision:
         # Most HTTP users will run the LLM agent; this stays as a simple baseline.
-        start_time = datetime.now()
+        start_time = datetime.now()  # one wall-clock snapshot: decision_id epoch
+        t0 = time.perf_counter_ns()  # monotonic: processing_time_ms
         trace: List[Dict[str, Any]] = []
 
-        requests = await self.read_resource("resource://requests")
-        request = next((r for r in requests if r["id"] == request_id), None)
-        if not request:
-            raise ValueError(f"Request {request_id} not found")
-
-        # 1) Validate
-        validation_result = await self.call_tool("validate_preset", {"request_id": request_id, "account_id": request["account"]})
-        trace.append({"step": "validate_preset", "result": validation_result, "timestamp": datetime.now().isoformat()})
+        request = request or await self._fetch_request(request_id)
+
+        # 1) Validate: the whole pipeline in one server-side call when offered, else validate
+        # (+ plan, which is read-only on the server, in the same /call_tools round-trip)
+        validate_args = {"request_id": request_id, "account_id": request["account"]}
+        plan_result: Optional[Dict[str, Any]] = None
+        bundle: Optional[Dict[str, Any]] = None
+        if self._server_fused and not self.fine_grained:
+            bundle = await self.call_tool("process_request", {"request_id": request_id})
+            validation_result, plan_result = bundle["validation_result"], bundle["plan_result"]
+        elif self.parallel_steps:
+            validation_result, plan_result = await self.call_tools(
+                [("validate_preset", validate_args), ("plan_steps", {"request_id": request_id})]
+            )
+        else:
+            validation_result = await self.call_tool("validate_preset", validate_args)
+        trace.append({"step": "validate_preset", "result": validation_result, "timestamp": now_iso()})
 
         if not validation_result.get("ok", False):
             status = "validation_failed"
-            customer_message = self._customer_message_from_validation(validation_result, request["account"])
-            clarifying_question = self._clarifying_question_from_validation(validation_result)
+            customer_message, clarifying_question = self._classify_validation(validation_result, request["account"])
             rationale = f"Validation failed: {', '.join(validation_result.get('errors', [])) or 'unknown error'}"
             decision = Decision(
                 request_id=request_id,
-                decision_id=f"mcp-{request_id}-{int(datetime.now().timestamp())}",
+                decision_id=f"mcp-{request_id}-{int(start_time.timestamp())}",
                 status=status,
                 rationale=rationale,
                 customer_message=customer_message,
@@ -206,19 +537,23 @@ class MCPAgent:
                 plan={},
                 assignment={},
                 trace=trace,
-                metrics={"processing_time_ms": int((datetime.now() - start_time).total_seconds() * 1000), "agent_type": self.__class__.__name__},
-                timestamp=datetime.now().isoformat(),
+                metrics={"processing_time_ms": (time.perf_counter_ns() - t0) // 1_000_000, "agent_type": self.__class__.__name__},
+                timestamp=now_iso(),
             )
-            await self.call_tool("record_decision", {"request_id": request_id, "decision": asdict(decision)})
+            await self.record_decision(decision)
             return decision
 
-        # 2) Plan
-        plan_result = await self.call_tool("plan_steps", {"request_id": request_id})
-        trace.append({"step": "plan_steps", "result": plan_result, "timestamp": datetime.now().isoformat()})
-
-        # 3) Assign
-        assignment_result = await self.call_tool("assign_artist", {"request_id": request_id})
-        trace.append({"step": "assign_artist", "result": assignment_result, "timestamp": datetime.now().isoformat()})
+        # 2) Plan + 3) Assign — assign only once validation passes (a failed request needs no artist)
+        if bundle is not None:
+            assignment_result = bundle["assignment_result"]
+        elif plan_result is None:
+            plan_result, assignment_result = await self.call_tools(
+                [("plan_steps", {"request_id": request_id}), ("assign_artist", {"request_id": request_id})]
+            )
+        else:
+            assignment_result = await self.call_tool("assign_artist", {"request_id": request_id})
+        trace.append({"step": "plan_steps", "result": plan_result, "timestamp": now_iso()})
+        trace.append({"step": "assign_artist", "result": assignment_result, "timestamp": now_iso()})
 
         # 4) Finalize
         if validation_result.get("ok") and assignment_result.get("artist_id"):
@@ -234,7 +569,7 @@ class MCPAgent:
 
         decision = Decision(
             request_id=request_id,
-            decision_id=f"mcp-{request_id}-{int(datetime.now().timestamp())}",
+            decision_id=f"mcp-{request_id}-{int(start_time.timestamp())}",
             status=status,
             rationale=rationale,
             customer_message=customer_message,
@@ -243,159 +578,80 @@ class MCPAgent:
             plan=plan_result,
             assignment=assignment_result,
             trace=trace,
-            metrics={"processing_time_ms": int((datetime.now() - start_time).total_seconds() * 1000), "agent_type": self.__class__.__name__},
-            timestamp=datetime.now().isoformat(),
+            metrics={"processing_time_ms": (time.perf_counter_ns() - t0) // 1_000_000, "agent_type": self.__class__.__name__},
+            timestamp=now_iso(),
         )
-        await self.call_tool("record_decision", {"request_id": request_id, "decision": asdict(decision)})
+        await self.record_decision(decision)
         return decision
 
     # ---------- messaging helpers ----------
-    def _parse_validation_errors(self, validation: Dict[str, Any]) -> Dict[str, Any]:
-        """Normalize validator errors into a taxonomy for messaging."""
-        errs = [str(e) for e in (validation or {}).get("errors", [])]
-        info: Dict[str, Any] = {
-            "missing_channels": [],
-            "no_packing": False,
-            "version_missing": False,
-            "engine_missing": False,
-            "engine_unsupported": None,
-            "unsupported_maps": [],
-            "map_conflicts": [],
-            "topology_quad_only": False,
-            "uv_missing": False,
-            "uv_overlap": False,
-            "size_exceeds": False,
-            "polycount_exceeds": False,
-        }
-        for e in errs:
-            low = e.lower()
-            if "missing texture channels" in low:
-                parts = e.split(":", 1)
-                if len(parts) == 2:
-                    chans = [c.strip().lower() for c in parts[1].replace(",", " ").split()]
-                    info["missing_channels"] = [c for c in chans if c in {"r", "g", "b", "a"}]
-                else:
-                    info["missing_channels"] = ["r", "g", "b", "a"]
-            if "no texture packing configuration" in low:
-                info["no_packing"] = True
-            if "preset version not specified" in low or ("version" in low and "not" in low and "specified" in low):
-                info["version_missing"] = True
-            if "engine not specified" in low or "missing engine" in low:
-                info["engine_missing"] = True
-            if "unsupported engine" in low or "engine not supported" in low:
-                parts = e.split(":", 1)
-                info["engine_unsupported"] = parts[1].strip() if len(parts) == 2 else True
-            if "unsupported map" in low or "unsupported texture" in low:
-                parts = e.split(":", 1)
-                if len(parts) == 2:
-                    info["unsupported_maps"].append(parts[1].strip())
-            if "conflicting maps" in low or "map conflict" in low:
-                info["map_conflicts"].append(e)
-            if "quad only" in low or "quad-only" in low:
-                info["topology_quad_only"] = True
-            if "missing uvs" in low or "uvs not found" in low:
-                info["uv_missing"] = True
-            if "uv overlap" in low or "overlapping uvs" in low:
-                info["uv_overlap"] = True
-            if "exceeds max texture size" in low or "texture too large" in low:
-                info["size_exceeds"] = True
-            if "exceeds polycount" in low or "polycount too high" in low:
-                info["polycount_exceeds"] = True
-        return info
-
-    def _customer_message_from_validation(self, validation: Dict[str, Any], account: str) -> str:
-        if validation.get("ok"):
-            return ""
-        info = self._parse_validation_errors(validation)
-        errs = validation.get("errors") or []
-
-        if info.get("no_packing") and info.get("version_missing"):
-            return "Validation error: No texture packing configuration found and no preset version specified. Please add a packing map (e.g., RGBA layout) and set a preset version."
-        if info.get("no_packing"):
-            return "Validation error: No texture packing configuration found. Please provide how channels should be packed (e.g., R: AO, G: Roughness, B: Metallic, A: Emissive)."
-        if info.get("missing_channels"):
-            missing = ", ".join(info["missing_channels"]).upper()
-            return f"Your texture packing is missing channel(s): {missing}. Please include those channels or confirm a default mapping so we can export engine-ready textures."
-        if info.get("unsupported_maps"):
-            maps_str = ", ".join(info["unsupported_maps"]) if info["unsupported_maps"] else "one or more maps"
-            return f"One or more requested texture maps are not supported ({maps_str}). Please remove them or choose supported equivalents."
-        if info.get("map_conflicts"):
-            return "There are conflicting map assignments in your preset. Please resolve duplicate or overlapping map targets before we proceed."
-        if info.get("engine_missing"):
-            return "Target engine is not specified. Please select an engine so we can apply the correct export and validation rules."
-        if info.get("engine_unsupported"):
-            eng = info.get("engine_unsupported")
-            extra = f" ({eng})" if isinstance(eng, str) else ""
-            return f"The selected engine is not supported{extra}. Please choose a supported engine (e.g., Unreal or Unity)."
-        if info.get("topology_quad_only"):
-            return "The preset enforces quad-only topology, but the model doesn't meet this requirement. Please provide a quad-only mesh or relax the topology rule."
-        if info.get("uv_missing"):
-            return "The model is missing UVs. Please include UVs or allow us to auto-unwrap before texturing."
-        if info.get("uv_overlap"):
-            return "The model has overlapping UVs beyond allowed thresholds. Please fix the UVs or permit us to auto-fix with packing."
-        if info.get("size_exceeds"):
-            return "One or more textures exceed the maximum supported size. Please reduce texture dimensions or approve downscaling."
-        if info.get("polycount_exceeds"):
-            return "The mesh exceeds the permitted polycount. Please provide a lower-poly version or allow us to decimate to target."
-
-        return "Validation error: " + "; ".join(str(e) for e in errs)
-
-    def _clarifying_question_from_validation(self, validation: Dict[str, Any]) -> Optional[str]:
-        if validation.get("ok"):
-            return None
-        info = self._parse_validation_errors(validation)
-
-        if info.get("missing_channels"):
-            missing = ", ".join(info["missing_channels"]).upper()
-            return f"We detected missing channel(s) {missing}. Should we apply a default mapping (e.g., map A to emissive) or would you prefer to update your preset first?"
-        if info.get("no_packing"):
-            return "Would you like us to apply a standard packing template (e.g., AO/Roughness/Metallic/Emissive) for this batch, or wait for your custom packing settings?"
-        if info.get("version_missing"):
-            return "Do you want us to assume the latest preset version, or will you specify the version you’re targeting?"
-        if info.get("unsupported_maps"):
-            return "Should we drop the unsupported maps or substitute with supported equivalents (e.g., use ORM instead of separate roughness/metallic)?"
-        if info.get("map_conflicts"):
-            return "Would you like us to auto-resolve the conflicting map assignments using a recommended template, or will you correct the preset?"
-        if info.get("engine_missing"):
-            return "Which engine should we target for export and validation (e.g., Unreal or Unity)?"
-        if info.get("engine_unsupported"):
-            return "Would you like to switch to a supported engine (e.g., Unreal or Unity), or should we stop this batch?"
-        if info.get("topology_quad_only"):
-            return "Should we enforce quad-only by retopologizing automatically, or wait for you to provide a quad-only mesh?"
-        if info.get("uv_missing"):
-            return "Do you want us to auto-unwrap UVs, or will you provide a mesh with UVs?"
-        if info.get("uv_overlap"):
-            return "Should we auto-fix overlapping UVs (may adjust pack/scale), or do you prefer to fix them on your side?"
-        if info.get("size_exceeds"):
-            return "Is it okay if we downscale oversized textures to the nearest supported resolution, or would you like to upload smaller maps?"
-        if info.get("polycount_exceeds"):
-            return "Do you want us to decimate the mesh to the target polycount, or will you provide a lighter model?"
-
-        return "Would you like us to apply sensible defaults now, or wait for your preset update?"
+    def _classify_validation(self, validation: Dict[str, Any], account: str) -> tuple[str, Optional[str]]:
+        """(customer_message, clarifying_question); the taxonomy is shared with the stdio client."""
+        return classify_validation(validation)
+
+    # Rationale templates, bound once (str.format of a pre-parsed constant)
+    _RATIONALE_SUCCESS = (
+        "Request {rid} from {account} processed successfully. "
+        "Validation passed (v{version}), "
+        "{n_steps} workflow steps planned, "
+        "assigned to {artist} with score {score}/20."
+    ).format
+    _RATIONALE_VALIDATION_FAILED = (
+        "Request {rid} failed validation: {errors}. "
+        "Customer preset must be fixed before processing."
+    ).format
+    _RATIONALE_UNASSIGNED = "Request {rid} validated but cannot be assigned: {reason}.".format
 
     def _rationale_from_parts(self, request, validation, plan, assignment, status) -> str:
         if status == "success":
-            return (
-                f"Request {request['id']} from {request['account']} processed successfully. "
-                f"Validation passed (v{validation.get('preset_version')}), "
-                f"{len(plan.get('steps', []))} workflow steps planned, "
-                f"assigned to {assignment.get('artist_name')} with score {assignment.get('match_score')}/20."
+            return self._RATIONALE_SUCCESS(
+                rid=request["id"],
+                account=request["account"],
+                version=validation.get("preset_version"),
+                n_steps=len(plan.get("steps", [])),
+                artist=assignment.get("artist_name"),
+                score=assignment.get("match_score"),
             )
         elif status == "validation_failed":
-            return (
-                f"Request {request['id']} failed validation: {', '.join(validation.get('errors', []))}. "
-                f"Customer preset must be fixed before processing."
-            )
+            return self._RATIONALE_VALIDATION_FAILED(rid=request["id"], errors=", ".join(validation.get("errors", [])))
         else:
-            return (
-                f"Request {request['id']} validated but cannot be assigned: "
-                f"{assignment.get('reason', 'No available artists')}."
-            )
+            return self._RATIONALE_UNASSIGNED(rid=request["id"], reason=assignment.get("reason", "No available artists"))
+
+class _TokenBucket:
+    """Async token bucket: refills at `rate_per_min` up to `burst`; acquire() waits for capacity.
+
+    A rate of 0 means unlimited (e.g. OPENAI_RPM=0 turns the limit off).
+    """
+
+    def __init__(self, rate_per_min: float, burst: float):
+        if rate_per_min < 0:
+            raise ValueError(f"rate_per_min must be >= 0, got {rate_per_min}")
+        self.rate = rate_per_min / 60.0
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()  # waiters are served in order
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        if self.rate == 0:
+            return
+        tokens = min(tokens, self.burst)  # an oversized call waits for a full bucket, not forever
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
 
 # =========================================================
 # LLMEnhancedMCPAgent — ReAct loop, mirrors stdio agent
 # =========================================================
 class LLMEnhancedMCPAgent(MCPAgent):
+    OBS_MAX_CHARS = 2048  # per-observation cap on prompt size (chars of compact JSON)
+
     def __init__(
         self,
         base_url: str | None = None,
@@ -406,24 +662,58 @@ class LLMEnhancedMCPAgent(MCPAgent):
         base_url_llm: Optional[str] = None,
         temperature: float = 0.2,
         max_steps: int = 6,
+        concurrency: int = 8,
+        use_llm_policy: bool = False,  # the canonical policy is deterministic; LLM is opt-in (evals/exploration)
+        transport: str = "http",
     ):
-        super().__init__(base_url=base_url, data_dir=data_dir, api_token=api_token)
+        super().__init__(base_url=base_url, data_dir=data_dir, api_token=api_token, concurrency=concurrency,
+                         transport=transport)
         self.model = model or os.getenv("OPENAI_MODEL", "gpt-4o-2024-08-06")
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
         self.base_url_llm = base_url_llm or os.getenv("OPENAI_BASE_URL")
         self.temperature = temperature
         self.max_steps = max_steps
 
-        if HAS_OPENAI and self.api_key:
-            if self.base_url_llm:
-                self.llm_client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url_llm)
-            else:
-                self.llm_client = AsyncOpenAI(api_key=self.api_key)
+        self._llm_sem = llm_semaphore()
+        # Pace calls to the provider's limits instead of bursting into 429s and client retries
+        self._llm_rpm = _TokenBucket(float(os.getenv("OPENAI_RPM", "500")), burst=50)
+        tpm = os.getenv("OPENAI_TPM")
+        self._llm_tpm = _TokenBucket(float(tpm), burst=float(tpm) / 10) if tpm else None
+        self.decide_counts = {"policy": 0, "llm": 0, "llm_invalid": 0}  # how each ReAct step was decided
+
+        self.use_llm_policy = use_llm_policy
+
+        if not use_llm_policy:
+            self.llm_client = None
+            logger.info("LLM policy off: ReAct steps follow the deterministic validate -> plan -> assign policy.")
+        elif HAS_OPENAI and self.api_key:
+            self.llm_client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url_llm or None,
+                max_retries=3,
+                timeout=30.0,
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+                    timeout=httpx.Timeout(30.0, connect=10.0),
+                    http2=HAS_H2,
+                ),
+            )
             logger.info(f"LLM wired: model={self.model} | key_set=True | base_url={self.base_url_llm or 'default'}")
         else:
             self.llm_client = None
             logger.info("LLM disabled (missing openai package or OPENAI_API_KEY).")
 
+    async def disconnect(self):
+        try:
+            await super().disconnect()
+        finally:
+            if self.llm_client is not None:
+                await self.llm_client.close()
+        counts = self.decide_counts
+        logger.info(f"ReAct decisions: policy={counts['policy']} llm={counts['llm']} llm_invalid={counts['llm_invalid']}")
+        if counts["llm"] and counts["llm_invalid"] / counts["llm"] > self.LLM_FALLBACK_ALERT:
+            logger.warning(f"{counts['llm_invalid']}/{counts['llm']} LLM ReAct replies were unusable; the policy stood in")
+
     # -------- ReAct step policy prompt --------
     def _react_system_prompt(self) -> str:
         return (
@@ -437,80 +727,106 @@ class LLMEnhancedMCPAgent(MCPAgent):
             "3) If validation passes, plan steps, then assign artist.\n"
             "4) Return ONLY a compact JSON object per step in this schema:\n"
             '{\"action\": \"validate_preset|plan_steps|assign_artist|finish\", \"args\": { ... }}\n'
-            "Do not include commentary. Keep args minimal and correct."
+            "Do not include commentary. Keep args minimal and correct.\n"
+            "Tool results arrive as user messages: {\"step_no\", \"action\", \"observation\"}."
         )
 
+    def _cap_observation(self, obs: Any) -> Any:
+        """Bound what one observation adds to the prompt; full results stay in the trace."""
+        text = _dumps(obs)
+        if len(text) <= self.OBS_MAX_CHARS:
+            return obs
+        logger.warning(f"Observation truncated for prompt ({len(text)} > {self.OBS_MAX_CHARS} chars)")
+        return text[: self.OBS_MAX_CHARS] + "...(truncated)"
+
+    @staticmethod
+    def _policy_forced(state: Dict[str, Any]) -> bool:
+        """True when the system-prompt rules leave the model no choice.
+
+        Rule 1: nothing has run yet -> validate. Rule 2: validation failed -> finish, and the
+        customer_message/clarifying_question come from the taxonomy templates anyway.
+        """
+        return "validation_result" not in state or not state["validation_result"].get("ok", False)
+
+    # The system-prompt rules as a state machine: the first row whose precondition holds names
+    # the next action. Every reachable state is covered, so the LLM is never required.
+    REACT_POLICY = (
+        ("validate_preset", lambda s: "validation_result" not in s),
+        ("finish", lambda s: not s["validation_result"].get("ok", False)),
+        ("plan_steps", lambda s: "plan_result" not in s),
+        ("assign_artist", lambda s: "assignment_result" not in s),
+        ("finish", lambda s: True),
+    )
+    # Warn at disconnect when more than this share of LLM replies had to be replaced by the policy
+    LLM_FALLBACK_ALERT = 0.05
+
+    def _heuristic_decide(self, request: Dict[str, Any], state: Dict[str, Any]) -> Dict[str, Any]:
+        """Canonical validate -> plan -> assign -> finish policy without the LLM."""
+        action = next(action for action, when in self.REACT_POLICY if when(state))
+        if action == "validate_preset":
+            args = {"request_id": request["id"], "account_id": request["account"]}
+        elif action == "finish":
+            args = {}
+        else:
+            args = {"request_id": request["id"]}
+        return {"action": action, "args": args}
+
     async def _react_decide(self, request: Dict[str, Any], state: Dict[str, Any], step_no: int) -> Dict[str, Any]:
         """
         Ask the LLM what to do next, given current observations/state.
-        state contains any of: validation_result, plan_result, assignment_result
+        state contains any of: validation_result, plan_result, assignment_result, plus
+        `messages`, the append-only transcript sent to the model
         """
-        if not self.llm_client:
-            # Fallback heuristic if LLM is not configured
-            if "validation_result" not in state:
-                return {"action": "validate_preset", "args": {"request_id": request["id"], "account_id": request["account"]}}
-            if not state["validation_result"].get("ok", False):
-                return {"action": "finish", "args": {}}
-            if "plan_result" not in state:
-                return {"action": "plan_steps", "args": {"request_id": request["id"]}}
-            if "assignment_result" not in state:
-                return {"action": "assign_artist", "args": {"request_id": request["id"]}}
-            return {"action": "finish", "args": {}}
-
-        user_context = {
-            "request": request,
-            "known_state": {
-                "has_validation": "validation_result" in state,
-                "validation_ok": state.get("validation_result", {}).get("ok"),
-                "has_plan": "plan_result" in state,
-                "has_assignment": "assignment_result" in state,
-            },
-            "observations": {
-                k: v for k, v in state.items()
-                if k in ("validation_result", "plan_result", "assignment_result")
-            },
-            "step_no": step_no,
-        }
-
-        resp = await self.llm_client.chat.completions.create(
-            model=self.model,
-            temperature=self.temperature,
-            messages=[
-                {"role": "system", "content": self._react_system_prompt()},
-                {"role": "user", "content": json.dumps(user_context, indent=2)},
-            ],
-            max_tokens=200,
-        )
+        if not self.llm_client or self._policy_forced(state):
+            self.decide_counts["policy"] += 1
+            return self._heuristic_decide(request, state)
+
+        self.decide_counts["llm"] += 1
+        await self._llm_rpm.acquire()
+        if self._llm_tpm is not None:
+            # ~4 chars per token for the prompt, plus the reply budget
+            await self._llm_tpm.acquire(sum(len(m["content"]) for m in state["messages"]) // 4 + 200)
+        async with self._llm_sem:
+            resp = await self.llm_client.chat.completions.create(
+                model=self.model,
+                temperature=self.temperature,
+                messages=state["messages"],
+                max_tokens=200,
+                # JSON mode: the reply is a single JSON object, so one parse is enough
+                response_format={"type": "json_object"},
+            )
         raw = resp.choices[0].message.content or "{}"
         try:
-            return json.loads(raw)
+            decision = _loads(raw)
         except Exception:
-            # Very defensive: try to extract JSON blob
-            start = raw.find("{")
-            end = raw.rfind("}")
-            if start != -1 and end != -1 and end > start:
-                try:
-                    return json.loads(raw[start:end+1])
-                except Exception:
-                    pass
-        # Last resort heuristic
-        return {"action": "finish", "args": {}}
-
-    async def process_request(self, request_id: str) -> Decision:
+            decision = None
+        if not isinstance(decision, dict) or "action" not in decision:
+            # Truncated or off-schema reply: take the deterministic step instead of finishing early
+            logger.warning(f"Unparseable ReAct decision for {request.get('id')}: {raw[:200]!r}")
+            self.decide_counts["llm_invalid"] += 1
+            return self._heuristic_decide(request, state)
+        return decision
+
+    async def process_request(self, request_id: str, request: Optional[Dict[str, Any]] = None) -> Decision:
         """
         Full ReAct loop driven by the LLM, mirroring run_agent.py.
         """
-        start_time = datetime.now()
+        start_time = datetime.now()  # one wall-clock snapshot: decision_id epoch
+        t0 = time.perf_counter_ns()  # monotonic: processing_time_ms
         trace: List[Dict[str, Any]] = []
         step_no = 1
 
-        # Load request
-        requests = await self.read_resource("resource://requests")
-        request = next((r for r in requests if r["id"] == request_id), None)
-        if not request:
-            raise ValueError(f"Request {request_id} not found")
+        # Load request (process_all_requests passes it in; standalone calls fetch it)
+        request = request or await self._fetch_request(request_id)
 
-        state: Dict[str, Any] = {}
+        # The transcript only ever grows (decisions and observation deltas are appended), so each
+        # step's prompt is a prefix of the next and the provider's prompt cache can reuse it
+        state: Dict[str, Any] = {
+            "messages": [
+                {"role": "system", "content": self._react_system_prompt()},
+                {"role": "user", "content": _dumps({"request": request})},
+            ]
+        }
 
         # ReAct loop
         for _ in range(self.max_steps):
@@ -519,6 +835,7 @@ class LLMEnhancedMCPAgent(MCPAgent):
             # DECIDE
             decide = await self._react_decide(request, state, step_no)
             self._print_block("DECIDE", decide)
+            state["messages"].append({"role": "assistant", "content": _dumps(decide)})
 
             action = decide.get("action")
             args = decide.get("args", {}) or {}
@@ -564,7 +881,10 @@ class LLMEnhancedMCPAgent(MCPAgent):
                 }
 
             self._print_block("OBSERVE", obs_min)
-            trace.append({"step": action, "result": result, "timestamp": datetime.now().isoformat()})
+            state["messages"].append(
+                {"role": "user", "content": _dumps({"step_no": step_no, "action": action, "observation": self._cap_observation(obs_min)})}
+            )
+            trace.append({"step": action, "result": result, "timestamp": now_iso()})
             logger.info("#" * 66)
             step_no += 1
 
@@ -584,8 +904,7 @@ class LLMEnhancedMCPAgent(MCPAgent):
 
         if not validation_result.get("ok", False):
             status = "validation_failed"
-            customer_message = self._customer_message_from_validation(validation_result, request["account"])
-            clarifying_question = self._clarifying_question_from_validation(validation_result)
+            customer_message, clarifying_question = self._classify_validation(validation_result, request["account"])
         elif not assignment_result.get("artist_id"):
             status = "assignment_failed"
             customer_message = "Your request is queued and will be assigned soon."
@@ -599,7 +918,7 @@ class LLMEnhancedMCPAgent(MCPAgent):
 
         decision = Decision(
             request_id=request_id,
-            decision_id=f"mcp-{request_id}-{int(datetime.now().timestamp())}",
+            decision_id=f"mcp-{request_id}-{int(start_time.timestamp())}",
             status=status,
             rationale=rationale,
             customer_message=customer_message,
@@ -609,15 +928,15 @@ class LLMEnhancedMCPAgent(MCPAgent):
             assignment=assignment_result,
             trace=trace,
             metrics={
-                "processing_time_ms": int((datetime.now() - start_time).total_seconds() * 1000),
+                "processing_time_ms": (time.perf_counter_ns() - t0) // 1_000_000,
                 "agent_type": "LLMEnhancedMCPAgent",
                 "react_steps": step_no - 1,
             },
-            timestamp=datetime.now().isoformat(),
+            timestamp=now_iso(),
         )
 
         # Persist decision on the server
-        await self.call_tool("record_decision", {"request_id": request_id, "decision": asdict(decision)})
+        await self.record_decision(decision)
         return decision
 
 # =========================================================
@@ -634,9 +953,17 @@ async def main():
     parser.add_argument("--server-url", default=None, help="Base URL of the running HTTP server (e.g., http://127.0.0.1:8765)")
     parser.add_argument("--agent-type", choices=["mcp", "llm"], default="mcp")
     parser.add_argument("--output", type=Path, default=Path("decisions.json"))
+    parser.add_argument("--format", choices=DecisionWriter.FORMATS, default="json",
+                        help="Output as a JSON array (resource order) or NDJSON (completion order)")
     parser.add_argument("--api-token", default=None, help="Bearer token if the server requires it")
     parser.add_argument("--llm-model", default=None, help="Override LLM model (e.g., gpt-4o-2024-08-06)")
+    parser.add_argument("--llm-policy", action="store_true", help="Let the LLM choose ReAct steps (llm agent only)")
     parser.add_argument("--max-steps", type=int, default=6)
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests processed in parallel")
+    parser.add_argument("--transport", choices=["http", "ws"], default="http",
+                        help="Send tool calls as HTTP posts or multiplexed over one WebSocket")
+    parser.add_argument("--fine-grained", action="store_true",
+                        help="mcp agent: call validate/plan/assign separately instead of the fused process_request tool")
     args = parser.parse_args()
 
     # The server reads its own data dir; infer it from the requests path so both point at the same folder
@@ -646,7 +973,8 @@ async def main():
     api_token = args.api_token or os.getenv("MCP_HTTP_TOKEN")
 
     if args.agent_type == "mcp":
-        agent = MCPAgent(base_url=base_url, data_dir=data_dir, api_token=api_token)
+        agent = MCPAgent(base_url=base_url, data_dir=data_dir, api_token=api_token,
+                         concurrency=args.concurrency, transport=args.transport, fine_grained=args.fine_grained)
     else:
         agent = LLMEnhancedMCPAgent(
             base_url=base_url,
@@ -654,15 +982,11 @@ async def main():
             api_token=api_token,
             model=args.llm_model or os.getenv("OPENAI_MODEL", "gpt-4o-2024-08-06"),
             max_steps=args.max_steps,
+            use_llm_policy=args.llm_policy,
+            concurrency=args.concurrency,
+            transport=args.transport,
         )
 
-    await agent.connect()
-    decisions = await agent.process_all_requests()
-    await agent.disconnect()
-
-    with open(args.output, "w") as f:
-        json.dump([asdict(d) for d in decisions], f, indent=2)
-
     # Summary — count success with synonyms and fallbacks
     def _is_success(d: Decision) -> bool:
         if d.status in {"success", "completed", "ok", "done"}:
@@ -671,14 +995,29 @@ async def main():
             return False
         return bool((d.validation_result or {}).get("ok")) and bool((d.assignment or {}).get("artist_id"))
 
+    # Each decision is written as soon as it can be, so file I/O overlaps with the remaining requests:
+    # NDJSON in completion order, the JSON array in resource order (early finishers wait their turn)
+    successes = 0
+    by_status: Counter = Counter()
+    await agent.connect()
+    try:
+        with DecisionWriter(args.output, args.format) as writer:
+            async for d in agent.iter_decisions(ordered=args.format == "json"):
+                writer.write(d)
+                successes += _is_success(d)
+                by_status[d.status] += 1
+    finally:
+        await agent.disconnect()
+    processed = writer.count
+
     print("\n" + "=" * 60)
     print("MCP Processing Complete (HTTP)")
     print("=" * 60)
-    print(f"Requests processed: {len(decisions)}")
-    successes = sum(1 for d in decisions if _is_success(d))
+    print(f"Requests processed: {processed}")
     print(f"Successful: {successes}")
-    print(f"Failed: {len(decisions) - successes}")
+    print(f"Failed: {processed - successes}")
+    print("By status: " + ", ".join(f"{status}={n}" for status, n in by_status.most_common()))
     print(f"\nResults saved to: {args.output}")
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    run_async(main())
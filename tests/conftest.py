@@ -0,0 +1,49 @@
+"""
+Shared pytest fixtures for the stdio and HTTP MCP tests
+"""
+
+import asyncio
+
+import pytest_asyncio
+
+from test_basic import _session_ctx
+from test_http import HTTPServerManager, _shared_client
+
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def mcp_session():
+    """One spawned server and MCP handshake per pytest process (per worker under xdist).
+
+    stdio_client's cancel scope must be entered and exited by the same task, but fixture
+    setup and teardown run in different ones, so a dedicated task holds the session open.
+    """
+    ready = asyncio.get_running_loop().create_future()
+    release = asyncio.Event()
+
+    async def _hold():
+        async with _session_ctx() as session:
+            ready.set_result(session)
+            await release.wait()
+
+    holder = asyncio.create_task(_hold())
+    await asyncio.wait({ready, holder}, return_when=asyncio.FIRST_COMPLETED)
+    if not ready.done():
+        holder.result()  # the server failed to start; surface its error
+    yield ready.result()
+    release.set()
+    await holder
+
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def server():
+    """One HTTP server process for every test in test_http.py"""
+    async with HTTPServerManager() as srv:
+        yield srv
+
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def client(server):
+    """The pooled client bound to the shared HTTP server"""
+    client = _shared_client(server.base_url)
+    yield client
+    await client.aclose()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Client-side tests for the stdio agent (run_agent.py)
+No server process: the agent's tool calls are stubbed per test
+"""
+
+import asyncio
+import json
+import sys
+import tempfile
+import time
+import traceback
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from mcp_common import _format_ns  # noqa: E402
+from run_agent import Decision, LLMEnhancedMCPAgent, MCPAgent, decision_to_dict  # noqa: E402
+
+pytestmark = pytest.mark.asyncio
+
+
+class _CannedAgent(MCPAgent):
+    """Answers every tool call with a fixed reply"""
+
+    def __init__(self, reply, **kwargs):
+        super().__init__(data_dir=ROOT / "data", **kwargs)
+        self.reply = reply
+
+    async def call_tool(self, name, args):
+        return self.reply
+
+
+def _decision(request_id: str) -> Decision:
+    return Decision(
+        request_id=request_id, decision_id=f"mcp-{request_id}-0", status="success", rationale=None,
+        customer_message=None, clarifying_question=None, validation_result={}, plan={},
+        assignment={}, trace=[], metrics={}, timestamp="",
+    )
+
+
+class _ScriptedAgent(MCPAgent):
+    """Serves a fixed request list; listed requests raise, the rest succeed"""
+
+    def __init__(self, request_ids, fail=(), **kwargs):
+        super().__init__(data_dir=ROOT / "data", concurrency=1, **kwargs)
+        self.request_ids = list(request_ids)
+        self.fail = set(fail)
+        self.processed = []
+        self.recorded = []
+
+    async def read_resource(self, uri):
+        return [{"id": rid, "account": "ArcadiaXR"} for rid in self.request_ids] if uri == "resource://requests" else {}
+
+    async def process_request(self, request):
+        self.processed.append(request["id"])
+        if request["id"] in self.fail:
+            raise RuntimeError(f"{request['id']} failed")
+        return _decision(request["id"])
+
+    async def call_tool(self, name, args):
+        self.recorded.extend(item["request_id"] for item in args.get("items", []))
+        return {"ok": True}
+
+
+async def test_call_tools_rejects_malformed_batch():
+    """Test that call_tools reports a bad batch_execute reply instead of failing on its shape"""
+    print("🧪 Testing call_tools error handling...")
+
+    calls = [("validate_preset", {"request_id": "req-001", "account_id": "ArcadiaXR"}),
+             ("plan_steps", {"request_id": "req-001"})]
+    cases = [
+        ({"raw": "Error executing tool batch_execute: 'operations'"}, "'operations'"),  # server-side failure
+        ([{"index": 0, "tool": "validate_preset", "ok": True, "result": {}}], "no per-call results"),  # short
+        ([{"ok": True, "result": {}}, {"ok": False, "error": "Unknown tool"}], "Tool plan_steps failed: Unknown tool"),
+    ]
+    for reply, expected in cases:
+        try:
+            await _CannedAgent(reply).call_tools(calls)
+        except RuntimeError as e:
+            assert expected in str(e), f"Unexpected error for {reply!r}: {e}"
+        else:
+            raise AssertionError(f"call_tools accepted {reply!r}")
+
+    print("✅ call_tools error handling tests passed")
+
+
+class _ScriptedLLMAgent(LLMEnhancedMCPAgent):
+    """ReAct agent whose 'LLM' replays fixed actions; every tool reply is tagged with its call number"""
+
+    def __init__(self, actions):
+        super().__init__(data_dir=ROOT / "data")
+        self.llm_client = object()  # anything truthy: take the ReAct path without a real client
+        self.actions = list(actions)
+        self.calls = []
+
+    async def _llm_decide_next_action(self, request, tool_schemas, observations):
+        await asyncio.sleep(0.02)  # long enough for the speculative call to finish first
+        return self.actions.pop(0)
+
+    async def call_tool(self, name, args):
+        self.calls.append(name)
+        n = len(self.calls)
+        await asyncio.sleep(0.005)
+        return {"ok": True, "call": n, "tool": name, "artist_id": "artist-1", "steps": []}
+
+
+async def test_wrong_speculation_is_discarded():
+    """Test that a prefetched tool result the LLM did not ask for never reaches the decision or trace"""
+    print("🧪 Testing speculative prefetch misprediction...")
+
+    # Step 1 speculates validate_preset (call 1) but the LLM picks plan_steps (call 2);
+    # step 2 speculates validate_preset again (call 3) and is right, as is assign_artist (call 4)
+    agent = _ScriptedLLMAgent([
+        {"action": "plan_steps", "args": {}},
+        {"action": "validate_preset", "args": {}},
+        {"action": "assign_artist", "args": {}},
+        {"action": "finish", "args": {"status": "success", "rationale": "ok"}},
+    ])
+    decision = await agent.process_request({"id": "req-001", "account": "ArcadiaXR"})
+
+    assert agent.calls == ["validate_preset", "plan_steps", "validate_preset", "assign_artist"], agent.calls
+    assert decision.validation_result["call"] == 3, f"Discarded prefetch leaked: {decision.validation_result}"
+    assert decision.plan["call"] == 2 and decision.assignment["call"] == 4
+    steps = [(t["step"], t["result"]["call"]) for t in decision.trace]
+    assert steps == [("plan_steps", 2), ("validate_preset", 3), ("assign_artist", 4)], f"Unexpected trace: {steps}"
+    assert (agent._spec_attempts, agent._spec_hits) == (3, 2)
+
+    print("✅ Speculative prefetch misprediction tests passed")
+
+
+class _StubBatchClient:
+    """Just enough of AsyncOpenAI's files/batches API to complete one batch with canned output"""
+
+    def __init__(self, output_text):
+        async def create_file(file, purpose):
+            return SimpleNamespace(id="file-in")
+
+        async def create_batch(**kwargs):
+            return SimpleNamespace(id="batch-1", status="completed", output_file_id="file-out")
+
+        async def content(file_id):
+            return SimpleNamespace(text=output_text)
+
+        self.files = SimpleNamespace(create=create_file, content=content)
+        self.batches = SimpleNamespace(create=create_batch)
+
+
+def _batch_line(custom_id, content):
+    body = {"choices": [{"message": {"content": json.dumps(content)}}]}
+    return json.dumps({"custom_id": custom_id, "response": {"body": body}})
+
+
+async def test_offline_batch_bad_output_lines():
+    """Test that malformed or unmatched Batch API output lines fall back instead of failing the run"""
+    print("🧪 Testing offline batch output handling...")
+
+    finish = {"action": "finish", "args": {"status": "success", "rationale": "from batch"}}
+    output = "\n".join([
+        _batch_line("req-001", finish),
+        "{not json",                                           # malformed line
+        json.dumps({"response": {"body": {}}}),                # custom_id missing
+        _batch_line("req-999", finish),                        # custom_id never submitted
+        _batch_line("req-003", finish)[:-5],                   # truncated
+    ])
+
+    class _OfflineAgent(_ScriptedLLMAgent):
+        async def read_resource(self, uri):
+            return [{"id": rid, "account": "ArcadiaXR"} for rid in ("req-001", "req-002", "req-003")]
+
+    agent = _OfflineAgent([])
+    agent.llm_client = _StubBatchClient(output)
+    with tempfile.TemporaryDirectory() as tmp:
+        decisions = await agent.process_all_requests_offline(Path(tmp) / "batch.jsonl")
+
+    by_id = {d.request_id: d for d in decisions}
+    assert sorted(by_id) == ["req-001", "req-002", "req-003"], f"Every request needs a decision: {sorted(by_id)}"
+    assert by_id["req-001"].rationale == "from batch"
+    for rid in ("req-002", "req-003"):
+        assert by_id[rid].rationale != "from batch", f"{rid} took another request's batch result"
+        assert by_id[rid].status == "success", f"{rid} should fall back to the deterministic status"
+
+    print("✅ Offline batch output tests passed")
+
+
+async def test_trace_timestamp_format():
+    """Test that the cached-prefix timestamp formatter matches datetime.isoformat() exactly"""
+    print("🧪 Testing trace timestamps...")
+
+    now = time.time_ns() // 1000 * 1000
+    # Same second twice (cached prefix), a whole second (no fraction), and a day rollover
+    for ns in (now, now + 1_000, now // 10**9 * 10**9, now + 86_400 * 10**9):
+        sec, us = divmod(ns // 1000, 1_000_000)
+        expected = datetime.fromtimestamp(sec).replace(microsecond=us).isoformat()
+        assert _format_ns(ns) == expected, f"{_format_ns(ns)} != {expected}"
+
+    print("✅ Trace timestamp tests passed")
+
+
+async def test_circuit_breaker_stops_new_requests():
+    """Test that FAILURE_THRESHOLD consecutive failures stop the run and a success resets the count"""
+    print("🧪 Testing circuit breaker...")
+
+    ids = [f"req-{n:03d}" for n in range(1, 11)]
+    threshold = MCPAgent.FAILURE_THRESHOLD
+
+    agent = _ScriptedAgent(ids, fail=ids)
+    decisions = await agent.process_all_requests()
+    assert agent.processed == ids[:threshold], f"Breaker should trip after {threshold} failures: {agent.processed}"
+    assert decisions == [] and agent.failed_ids == ids, "Skipped requests must be reported as failed"
+
+    # A success in between resets the count, so the breaker never trips
+    fail = set(ids[:threshold - 1]) | set(ids[threshold:])
+    agent = _ScriptedAgent(ids, fail=fail)
+    await agent.process_all_requests()
+    assert len(agent.processed) == 2 * threshold, f"Breaker tripped too early: {agent.processed}"
+
+    print("✅ Circuit breaker tests passed")
+
+
+async def test_checkpoint_resume():
+    """Test that --resume restores saved decisions, skips corrupt lines and ignores stale checkpoints otherwise"""
+    print("🧪 Testing checkpoint resume...")
+
+    ids = ["req-001", "req-002", "req-003"]
+    good = json.dumps(decision_to_dict(_decision("req-001"))) + "\n"
+    with tempfile.TemporaryDirectory() as tmp:
+        checkpoint = Path(tmp) / "decisions.json.partial"
+
+        # Good line, corrupt complete line, a record missing fields, then a torn trailing write
+        checkpoint.write_text(good + "{not json\n" + '{"request_id": "req-002"}\n' + '{"request_id": "req-0')
+        agent = _ScriptedAgent(ids, checkpoint=checkpoint, resume=True)
+        decisions = await agent.process_all_requests()
+        assert agent.processed == ["req-002", "req-003"], f"Restored request was reprocessed: {agent.processed}"
+        assert [d.request_id for d in decisions] == ids, "Output should cover every request in resource order"
+        # process_request records its own decisions; restored ones are re-recorded by the run
+        assert agent.recorded == ["req-001"], f"Restored decision should be recorded: {agent.recorded}"
+        lines = checkpoint.read_bytes().split(b"\n")
+        assert lines[-1] == b"" and all(lines[:-1]), "Torn trailing line should be dropped before appending"
+
+        # Without --resume a leftover checkpoint (e.g. from another data dir) is not trusted
+        checkpoint.write_text(good)
+        agent = _ScriptedAgent(ids, checkpoint=checkpoint)
+        await agent.process_all_requests()
+        assert agent.processed == ids, f"Stale checkpoint should be ignored: {agent.processed}"
+
+    print("✅ Checkpoint resume tests passed")
+
+
+async def main():
+    """Run all tests"""
+    print("🚀 Starting stdio Agent Tests")
+    print("=" * 50)
+
+    tests = [
+        test_call_tools_rejects_malformed_batch,
+        test_wrong_speculation_is_discarded,
+        test_offline_batch_bad_output_lines,
+        test_trace_timestamp_format,
+        test_circuit_breaker_stops_new_requests,
+        test_checkpoint_resume,
+    ]
+    failures = []
+    for t in tests:
+        try:
+            await t()
+        except Exception as e:
+            failures.append((t.__name__, e))
+
+    print("=" * 50)
+    if not failures:
+        print("🎉 All tests passed!")
+        return
+    for name, exc in failures:
+        print(f"❌ {name} failed: {exc}")
+        print("".join(traceback.format_exception(type(exc), exc, exc.__traceback__)))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
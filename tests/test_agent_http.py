@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Client-side tests for the HTTP agent (run_agent_http.py)
+No server needed: the agent's I/O methods are stubbed per test
+"""
+
+import asyncio
+import json
+import sys
+import tempfile
+import time
+import traceback
+from pathlib import Path
+
+import httpx
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from run_agent_http import Decision, DecisionWriter, MCPAgent, _TokenBucket  # noqa: E402
+
+pytestmark = pytest.mark.asyncio
+
+
+def _decision(request_id: str) -> Decision:
+    return Decision(
+        request_id=request_id, decision_id=f"mcp-{request_id}-0", status="success", rationale=None,
+        customer_message=None, clarifying_question=None, validation_result={}, plan={},
+        assignment={}, trace=[], metrics={}, timestamp="",
+    )
+
+
+class _FlakyServer:
+    """Minimal HTTP/1.1 server: /call_tool fails `failures` times (503 or a dropped connection), then succeeds"""
+
+    def __init__(self, failures: int, mode: str = "503"):
+        self.failures = failures
+        self.mode = mode
+        self.tool_calls = 0
+        self.url = ""
+        self._server = None
+
+    async def __aenter__(self) -> "_FlakyServer":
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.url = f"http://127.0.0.1:{self._server.sockets[0].getsockname()[1]}"
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                await reader.readexactly(length)
+                status, body = 200, b'{"server_name": "flaky"}'
+                if head.startswith(b"POST /call_tool "):
+                    self.tool_calls += 1
+                    if self.tool_calls <= self.failures:
+                        if self.mode == "drop":
+                            return
+                        status, body = 503, b"{}"
+                    else:
+                        body = b'{"data": {"ok": true}}'
+                writer.write(
+                    f"HTTP/1.1 {status} X\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+class _ScriptedAgent(MCPAgent):
+    """Serves a fixed request list; each request finishes after its own delay or raises"""
+
+    def __init__(self, delays, fail=()):
+        super().__init__(concurrency=len(delays))
+        self.delays = delays
+        self.fail = set(fail)
+
+    async def read_resource(self, uri):
+        return [{"id": rid} for rid in self.delays]
+
+    async def process_request(self, request_id, request=None):
+        await asyncio.sleep(self.delays[request_id])
+        if request_id in self.fail:
+            raise RuntimeError(f"{request_id} failed")
+        return _decision(request_id)
+
+
+async def test_json_output_keeps_resource_order():
+    """Test that the JSON array is written in resource order even when requests finish out of order"""
+    print("🧪 Testing decisions file order...")
+
+    # req-001 finishes last and req-003 fails; the rest must not wait behind a gap forever
+    delays = {"req-001": 0.06, "req-002": 0.02, "req-003": 0.01, "req-004": 0.0}
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt, ordered in (("json", True), ("ndjson", False)):
+            path = Path(tmp) / f"decisions.{fmt}"
+            agent = _ScriptedAgent(delays, fail={"req-003"})
+            with DecisionWriter(path, fmt) as writer:
+                async for d in agent.iter_decisions(ordered=ordered):
+                    writer.write(d)
+            text = path.read_text()
+            records = json.loads(text) if fmt == "json" else [json.loads(line) for line in text.splitlines()]
+            order = [r["request_id"] for r in records]
+            if ordered:
+                assert order == ["req-001", "req-002", "req-004"], f"JSON should follow resource order: {order}"
+            else:
+                assert order == ["req-004", "req-002", "req-001"], f"NDJSON should follow completion order: {order}"
+
+    print("✅ Decisions file order tests passed")
+
+
+async def test_token_bucket_timing():
+    """Test that the token bucket spends its burst at once, then waits for the refill"""
+    print("🧪 Testing token bucket...")
+
+    bucket = _TokenBucket(rate_per_min=600, burst=2)  # 10 tokens/s
+    t0 = time.monotonic()
+    await bucket.acquire()
+    await bucket.acquire()
+    assert time.monotonic() - t0 < 0.05, "Burst should not wait"
+    await bucket.acquire()
+    waited = time.monotonic() - t0
+    assert 0.08 <= waited < 0.5, f"Third token should wait ~0.1s for the refill, waited {waited:.3f}s"
+    await bucket.acquire(tokens=5)  # capped at burst: waits for a full bucket, not forever
+    assert time.monotonic() - t0 < 1.0, "Oversized acquire should be capped at burst"
+
+    # Rate 0 means unlimited; a negative rate is a configuration error
+    t0 = time.monotonic()
+    unlimited = _TokenBucket(rate_per_min=0, burst=0)
+    for _ in range(100):
+        await unlimited.acquire()
+    assert time.monotonic() - t0 < 0.05, "Rate 0 should never wait"
+    try:
+        _TokenBucket(rate_per_min=-1, burst=1)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Negative rate should be rejected")
+
+    print("✅ Token bucket tests passed")
+
+
+async def test_send_retries_once_per_attempt():
+    """Test that a failing server sees exactly one hit per _send attempt (no transport-level retries)"""
+    print("🧪 Testing HTTP retries...")
+
+    attempts = MCPAgent.HTTP_MAX_ATTEMPTS
+    args = {"request_id": "req-001", "account_id": "ArcadiaXR"}
+    for mode in ("503", "drop"):
+        # Fails every attempt but the last: recovers, one request per attempt
+        async with _FlakyServer(failures=attempts - 1, mode=mode) as server:
+            agent = MCPAgent(base_url=server.url)
+            agent.RETRY_BASE_DELAY = 0.01
+            await agent.connect()
+            try:
+                assert await agent.call_tool("validate_preset", args) == {"ok": True}
+            finally:
+                await agent.client.aclose()
+            assert server.tool_calls == attempts, f"{mode}: expected {attempts} requests, server saw {server.tool_calls}"
+
+    # Fails every attempt: gives up after HTTP_MAX_ATTEMPTS; non-idempotent calls are never retried
+    for tool, expected in (("validate_preset", attempts), ("record_decisions", 1)):
+        async with _FlakyServer(failures=attempts) as server:
+            agent = MCPAgent(base_url=server.url)
+            agent.RETRY_BASE_DELAY = 0.01
+            await agent.connect()
+            try:
+                await agent.call_tool(tool, {"items": []} if tool == "record_decisions" else args)
+            except httpx.HTTPStatusError:
+                pass
+            else:
+                raise AssertionError(f"{tool} should fail when every attempt fails")
+            finally:
+                await agent.client.aclose()
+            assert server.tool_calls == expected, f"{tool}: expected {expected} requests, server saw {server.tool_calls}"
+
+    print("✅ HTTP retry tests passed")
+
+
+async def main():
+    """Run all tests"""
+    print("🚀 Starting HTTP Agent Tests")
+    print("=" * 50)
+
+    tests = [test_json_output_keeps_resource_order, test_token_bucket_timing, test_send_retries_once_per_attempt]
+    failures = []
+    for t in tests:
+        try:
+            await t()
+        except Exception as e:
+            failures.append((t.__name__, e))
+
+    print("=" * 50)
+    if not failures:
+        print("🎉 All tests passed!")
+        return
+    for name, exc in failures:
+        print(f"❌ {name} failed: {exc}")
+        print("".join(traceback.format_exception(type(exc), exc, exc.__traceback__)))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -5,84 +5,100 @@ Basic tests for MCP Agent System
 
 import asyncio
 import json
-import tempfile
+import sys
+import traceback
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import AsyncIterator
 
+import pytest
 from mcp import StdioServerParameters
 from mcp.client.session import ClientSession
 from mcp.client.stdio import stdio_client
 
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
 
-async def test_valid_vs_invalid_preset():
+ROOT = Path(__file__).resolve().parent.parent
+
+# Spawn the server with this interpreter, independent of the working directory
+SERVER_PARAMS = StdioServerParameters(
+    command=sys.executable,
+    args=[str(ROOT / "mcp_server.py"), str(ROOT / "data")],
+    env=None,
+)
+
+
+# Every test shares the one event loop the session-scoped `mcp_session` fixture (conftest.py) lives on
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+@asynccontextmanager
+async def _session_ctx() -> AsyncIterator[ClientSession]:
+    """Spawn the server and yield one initialized session; shared by main() and the pytest fixture."""
+    async with stdio_client(SERVER_PARAMS) as (read_stream, write_stream):
+        async with ClientSession(read_stream, write_stream) as session:
+            await session.initialize()
+            yield session
+
+
+def _contains(errors, needle: str) -> bool:
+    """True if any error mentions `needle`; one scan over the newline-joined errors."""
+    return needle in "\n".join(map(str, errors))
+
+
+async def test_valid_vs_invalid_preset(mcp_session: ClientSession):
     """Test valid vs invalid preset validation"""
     print("🧪 Testing preset validation...")
 
-    # Start MCP server
-    server_params = StdioServerParameters(
-        command="/Users/bryantan/Documents/GitHub/Kaedim_MCP_Agent/.venv/bin/python",
-        args=["mcp_server.py", "data"],
-        env=None,
+    # Test valid preset (ArcadiaXR)
+    result1 = await mcp_session.call_tool(
+        "validate_preset", {"request_id": "req-001", "account_id": "ArcadiaXR"}
     )
+    valid_result = _loads(result1.content[0].text)
+    assert valid_result["ok"] == True, "ArcadiaXR preset should be valid"
+    assert valid_result["preset_version"] == 3, "Should have correct version"
 
-    async with stdio_client(server_params) as (read_stream, write_stream):
-        async with ClientSession(read_stream, write_stream) as session:
-            await session.initialize()
+    # Test invalid preset (TitanMfg - missing 'a' channel)
+    result2 = await mcp_session.call_tool(
+        "validate_preset", {"request_id": "req-002", "account_id": "TitanMfg"}
+    )
+    invalid_result = _loads(result2.content[0].text)
+    assert invalid_result["ok"] == False, "TitanMfg preset should be invalid"
+    assert _contains(invalid_result["errors"], "Missing texture channels: a"), "Should mention missing 'a' channel"
 
-            # Test valid preset (ArcadiaXR)
-            result1 = await session.call_tool(
-                "validate_preset", {"request_id": "req-001", "account_id": "ArcadiaXR"}
-            )
-            valid_result = json.loads(result1.content[0].text)
-            assert valid_result["ok"] == True, "ArcadiaXR preset should be valid"
-            assert valid_result["preset_version"] == 3, "Should have correct version"
-
-            # Test invalid preset (TitanMfg - missing 'a' channel)
-            result2 = await session.call_tool(
-                "validate_preset", {"request_id": "req-002", "account_id": "TitanMfg"}
-            )
-            invalid_result = json.loads(result2.content[0].text)
-            assert invalid_result["ok"] == False, "TitanMfg preset should be invalid"
-            assert any("Missing texture channels: a" in str(err) for err in invalid_result["errors"]), "Should mention missing 'a' channel"
-
-            # Test non-existent account
-            result3 = await session.call_tool(
-                "validate_preset", {"request_id": "req-001", "account_id": "NonExistentAccount"}
-            )
-            nonexistent_result = json.loads(result3.content[0].text)
-            assert nonexistent_result["ok"] == False, "Non-existent account should be invalid"
-
-            print("✅ Preset validation tests passed")
-
-
-async def test_capacity_overflow():
+    # Test non-existent account
+    result3 = await mcp_session.call_tool(
+        "validate_preset", {"request_id": "req-001", "account_id": "NonExistentAccount"}
+    )
+    nonexistent_result = _loads(result3.content[0].text)
+    assert nonexistent_result["ok"] == False, "Non-existent account should be invalid"
+
+    print("✅ Preset validation tests passed")
+
+
+async def test_capacity_overflow(mcp_session: ClientSession):
     """Test artist capacity overflow handling"""
     print("🧪 Testing capacity overflow...")
 
-    server_params = StdioServerParameters(
-        command="/Users/bryantan/Documents/GitHub/Kaedim_MCP_Agent/.venv/bin/python",
-        args=["mcp_server.py", "data"],
-        env=None,
+    # Ada is at full capacity (2/2), Ben has 1 slot, Cleo has 1 slot
+    # Test assignment for Unity project (should prefer Cleo over Ben)
+    result = await mcp_session.call_tool(
+        "assign_artist", {"request_id": "req-003"}  # BlueNova Unity project
     )
+    assignment = _loads(result.content[0].text)
+    assert (
+        assignment["artist_name"] == "Cleo"
+    ), "Should assign to Cleo (Unity specialist)"
+    assert assignment["match_score"] > 0, "Should have positive match score"
 
-    async with stdio_client(server_params) as (read_stream, write_stream):
-        async with ClientSession(read_stream, write_stream) as session:
-            await session.initialize()
-
-            # Ada is at full capacity (2/2), Ben has 1 slot, Cleo has 1 slot
-            # Test assignment for Unity project (should prefer Cleo over Ben)
-            result = await session.call_tool(
-                "assign_artist", {"request_id": "req-003"}  # BlueNova Unity project
-            )
-            assignment = json.loads(result.content[0].text)
-            assert (
-                assignment["artist_name"] == "Cleo"
-            ), "Should assign to Cleo (Unity specialist)"
-            assert assignment["match_score"] > 0, "Should have positive match score"
-
-            print("✅ Capacity overflow tests passed")
+    print("✅ Capacity overflow tests passed")
 
 
-async def test_idempotency():
+async def test_idempotency(mcp_session: ClientSession):
     """Test that same input produces same Decision.id"""
     print("🧪 Testing idempotency...")
 
@@ -90,33 +106,59 @@ async def test_idempotency():
     # For a real implementation, you'd want deterministic IDs based on input hash
     # For now, just verify that the decisions are structurally consistent
 
-    server_params = StdioServerParameters(
-        command="/Users/bryantan/Documents/GitHub/Kaedim_MCP_Agent/.venv/bin/python",
-        args=["mcp_server.py", "data"],
-        env=None,
+    # Run validation twice
+    result1 = await mcp_session.call_tool(
+        "validate_preset", {"request_id": "req-001", "account_id": "ArcadiaXR"}
+    )
+    result2 = await mcp_session.call_tool(
+        "validate_preset", {"request_id": "req-001", "account_id": "ArcadiaXR"}
     )
 
-    async with stdio_client(server_params) as (read_stream, write_stream):
-        async with ClientSession(read_stream, write_stream) as session:
-            await session.initialize()
+    validation1 = _loads(result1.content[0].text)
+    validation2 = _loads(result2.content[0].text)
+
+    # Same inputs should produce same validation results
+    assert validation1["ok"] == validation2["ok"]
+    assert validation1["errors"] == validation2["errors"]
+    assert validation1["preset_version"] == validation2["preset_version"]
+
+    print("✅ Idempotency tests passed")
+
 
-            # Run validation twice
-            result1 = await session.call_tool(
-                "validate_preset", {"request_id": "req-001", "account_id": "ArcadiaXR"}
-            )
-            result2 = await session.call_tool(
-                "validate_preset", {"request_id": "req-001", "account_id": "ArcadiaXR"}
-            )
+async def test_bulk_record_decisions(mcp_session: ClientSession):
+    """Test that record_decisions persists a whole batch in one call"""
+    print("🧪 Testing bulk decision recording...")
 
-            validation1 = json.loads(result1.content[0].text)
-            validation2 = json.loads(result2.content[0].text)
+    items = [
+        {"request_id": rid, "decision": {"status": "success", "rationale": "bulk"}}
+        for rid in ("req-001", "req-002", "req-003")
+    ]
+    result = await mcp_session.call_tool("record_decisions", {"items": items})
+    recorded = _loads(result.content[0].text)
+    assert recorded["count"] == 3, "Should record every decision in the batch"
+    assert len({d["decision_id"] for d in recorded["decisions"]}) == 3, "Decision IDs should be unique"
+    assert all(d["status"] == "success" for d in recorded["decisions"])
 
-            # Same inputs should produce same validation results
-            assert validation1["ok"] == validation2["ok"]
-            assert validation1["errors"] == validation2["errors"]
-            assert validation1["preset_version"] == validation2["preset_version"]
+    print("✅ Bulk decision recording tests passed")
 
-            print("✅ Idempotency tests passed")
+
+async def test_batch_execute(mcp_session: ClientSession):
+    """Test that batch_execute runs several tools in one call, in order"""
+    print("🧪 Testing batch_execute...")
+
+    operations = [
+        {"tool": "validate_preset", "arguments": {"request_id": "req-001", "account_id": "ArcadiaXR"}},
+        {"tool": "plan_steps", "arguments": {"request_id": "req-001"}},
+        {"tool": "invalid_tool", "arguments": {}},
+    ]
+    result = await mcp_session.call_tool("batch_execute", {"operations": operations})
+    results = _loads(result.content[0].text)
+    assert [r["index"] for r in results] == [0, 1, 2], "Results should come back in call order"
+    assert results[0]["ok"] and results[0]["result"]["ok"] == True
+    assert results[1]["ok"] and len(results[1]["result"]["steps"]) > 0
+    assert not results[2]["ok"], "A failing operation should be reported without aborting the batch"
+
+    print("✅ batch_execute tests passed")
 
 
 async def main():
@@ -124,20 +166,34 @@ async def main():
     print("🚀 Starting MCP Agent Tests")
     print("=" * 50)
 
+    # (test name, exception); tracebacks are formatted once, after the run
+    failures = []
     try:
-        await test_valid_vs_invalid_preset()
-        await test_capacity_overflow()
-        await test_idempotency()
-
-        print("=" * 50)
-        print("🎉 All tests passed!")
-
+        # One server process and handshake for the whole run
+        async with _session_ctx() as session:
+            # Read-only tests overlap on the shared session; the rest run after them, in order
+            parallel_safe = (test_valid_vs_invalid_preset, test_idempotency, test_batch_execute)
+            serial = (test_capacity_overflow, test_bulk_record_decisions)
+
+            results = await asyncio.gather(*(t(session) for t in parallel_safe), return_exceptions=True)
+            failures += [(t.__name__, r) for t, r in zip(parallel_safe, results) if isinstance(r, Exception)]
+
+            for t in serial:
+                try:
+                    await t(session)
+                except Exception as e:
+                    failures.append((t.__name__, e))
     except Exception as e:
-        print(f"❌ Test failed: {e}")
-        import traceback
-
-        traceback.print_exc()
+        # The server failed to start or the session broke mid-run
+        failures.append(("mcp_session", e))
 
+    print("=" * 50)
+    if not failures:
+        print("🎉 All tests passed!")
+        return
+    for name, exc in failures:
+        print(f"❌ {name} failed: {exc}")
+        print("".join(traceback.format_exception(type(exc), exc, exc.__traceback__)))
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -88,70 +88,77 @@ def test_all_artists_at_capacity():
         import asyncio
 
         async def run_test():
-            print("🧪 Testing Artist Assignment When All At Capacity")
-            print("=" * 60)
+            # Buffer the report and write it once instead of one print() per line
+            parts = ["🧪 Testing Artist Assignment When All At Capacity", "=" * 60]
 
             # Show current artist status
-            print("\n📊 Artist Capacity Status:")
-            for artist in server.artists:
-                capacity = artist.get("capacity_concurrent", 1)
-                load = artist.get("active_load", 0)
-                available = capacity - load
-                status = "✅ AVAILABLE" if available > 0 else "❌ AT CAPACITY"
-                print(f"  {artist['name']}: {load}/{capacity} slots used - {status}")
-
-            print(f"\n🔍 Testing assignment for request: req-overflow")
-            print(f"   Requirements: stylized_hard_surface, Unreal engine")
+            parts.append("\n📊 Artist Capacity Status:")
+            slots = [
+                (artist["name"], artist.get("active_load", 0), artist.get("capacity_concurrent", 1))
+                for artist in server.artists
+            ]
+            for name, load, capacity in slots:
+                status = "✅ AVAILABLE" if capacity - load > 0 else "❌ AT CAPACITY"
+                parts.append(f"  {name}: {load}/{capacity} slots used - {status}")
+
+            parts.append("\n🔍 Testing assignment for request: req-overflow")
+            parts.append("   Requirements: stylized_hard_surface, Unreal engine")
 
             # Test the assignment
             result = await server._assign_artist("req-overflow")
 
-            print(f"\n📋 Assignment Result:")
-            print(f"   Artist ID: {result.get('artist_id')}")
-            print(f"   Artist Name: {result.get('artist_name', 'None')}")
-            print(f"   Reason: {result.get('reason')}")
-            print(f"   Match Score: {result.get('match_score', 0)}")
+            parts += [
+                "\n📋 Assignment Result:",
+                f"   Artist ID: {result.get('artist_id')}",
+                f"   Artist Name: {result.get('artist_name', 'None')}",
+                f"   Reason: {result.get('reason')}",
+                f"   Match Score: {result.get('match_score', 0)}",
+            ]
 
             if result.get("artist_id") is None:
-                print(f"\n🚨 CAPACITY OVERFLOW DETECTED!")
-                print(f"   Status: No assignment possible")
-                print(f"   System Response: {result.get('reason')}")
-
-                # Show what the client would do
-                print(f"\n🤖 Client Response:")
-                print(f"   Decision Status: 'assignment_failed'")
-                print(
-                    f"   Customer Message: 'Your request is queued and will be assigned soon.'"
-                )
-                print(f"   Clarifying Question: 'Would you like priority processing?'")
-
-                print(f"\n⚠️  CURRENT BEHAVIOR ISSUES:")
-                print(f"   ❌ Request is marked as 'failed' but should be 'queued'")
-                print(f"   ❌ No actual queuing system - request just sits in limbo")
-                print(f"   ❌ No estimated wait time provided to customer")
-                print(f"   ❌ No capacity prediction or overflow handling")
-                print(f"   ❌ No notification when capacity becomes available")
+                parts += [
+                    "\n🚨 CAPACITY OVERFLOW DETECTED!",
+                    "   Status: No assignment possible",
+                    f"   System Response: {result.get('reason')}",
+                    # Show what the client would do
+                    "\n🤖 Client Response:",
+                    "   Decision Status: 'assignment_failed'",
+                    "   Customer Message: 'Your request is queued and will be assigned soon.'",
+                    "   Clarifying Question: 'Would you like priority processing?'",
+                    "\n⚠️  CURRENT BEHAVIOR ISSUES:",
+                    "   ❌ Request is marked as 'failed' but should be 'queued'",
+                    "   ❌ No actual queuing system - request just sits in limbo",
+                    "   ❌ No estimated wait time provided to customer",
+                    "   ❌ No capacity prediction or overflow handling",
+                    "   ❌ No notification when capacity becomes available",
+                ]
             else:
-                print(f"✅ Assignment successful (unexpected in this test)")
+                parts.append("✅ Assignment successful (unexpected in this test)")
 
+            sys.stdout.write("\n".join(parts) + "\n")
             return result
 
         # Run the test
         result = asyncio.run(run_test())
 
-        print(f"\n" + "=" * 60)
-        print(f"📝 SUMMARY: What happens when all artists are at capacity?")
-        print(f"=" * 60)
-        print(f"1. assign_artist tool returns: artist_id = None")
-        print(f"2. Client marks request as: status = 'assignment_failed'")
-        print(
-            f"3. Customer gets message: 'Your request is queued and will be assigned soon.'"
+        sys.stdout.write("\n".join([
+            "\n" + "=" * 60,
+            "📝 SUMMARY: What happens when all artists are at capacity?",
+            "=" * 60,
+            "1. assign_artist tool returns: artist_id = None",
+            "2. Client marks request as: status = 'assignment_failed'",
+            "3. Customer gets message: 'Your request is queued and will be assigned soon.'",
+            "4. But there's NO actual queue - it's just a polite lie!",
+            "5. Request sits in database with 'failed' status forever",
+            "6. No mechanism to retry when capacity becomes available",
+        ]) + "\n")
+
+        # Every artist is full: either nobody is assigned, or the best skill match is picked
+        # anyway and the overflow is flagged in the reason (current server behaviour)
+        assert result.get("reason"), f"Overflow result should carry a reason: {result}"
+        assert result.get("artist_id") is None or "at full capacity" in result["reason"], (
+            f"Full-capacity assignment not flagged: {result}"
         )
-        print(f"4. But there's NO actual queue - it's just a polite lie!")
-        print(f"5. Request sits in database with 'failed' status forever")
-        print(f"6. No mechanism to retry when capacity becomes available")
-
-        return result
 
 
 if __name__ == "__main__":
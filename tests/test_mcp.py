@@ -6,29 +6,42 @@ Simple test script to debug MCP connection
 import asyncio
 import json
 import logging
+import sys
+from pathlib import Path
 
+import pytest
 from mcp import StdioServerParameters
 from mcp.client.session import ClientSession
 from mcp.client.stdio import stdio_client
 
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+pytestmark = pytest.mark.asyncio
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+ROOT = Path(__file__).resolve().parent.parent
+
+# Spawn the server with this interpreter, independent of the working directory
+SERVER_PARAMS = StdioServerParameters(
+    command=sys.executable,
+    args=[str(ROOT / "mcp_server.py"), str(ROOT / "data")],
+    env=None,
+)
+
 
 async def test_mcp():
     """Test MCP connection and resource reading"""
 
-    # Start MCP server
-    server_params = StdioServerParameters(
-        command="/Users/bryantan/Documents/GitHub/Kaedim_MCP_Agent/.venv/bin/python",
-        args=["mcp_server.py", "data"],
-        env=None,
-    )
-
     print("Starting MCP test...")
 
     try:
-        async with stdio_client(server_params) as (read_stream, write_stream):
+        async with stdio_client(SERVER_PARAMS) as (read_stream, write_stream):
             async with ClientSession(read_stream, write_stream) as session:
                 await session.initialize()
                 print("✅ Connected to MCP server successfully")
@@ -45,15 +58,20 @@ async def test_mcp():
                     f"✅ Found {len(resources.resources)} resources: {[str(r.uri) for r in resources.resources]}"
                 )
 
-                # Try reading each resource
-                for resource in resources.resources:
+                # Try reading each resource; the reads are pipelined over the one session
+                results = await asyncio.gather(
+                    *(session.read_resource(str(r.uri)) for r in resources.resources),
+                    return_exceptions=True,
+                )
+                for resource, result in zip(resources.resources, results):
                     try:
-                        result = await session.read_resource(str(resource.uri))
+                        if isinstance(result, Exception):
+                            raise result
                         print(
                             f"✅ Read {resource.uri}: {len(result.contents)} content items"
                         )
                         if result.contents:
-                            data = json.loads(result.contents[0].text)
+                            data = _loads(result.contents[0].text)
                             print(f"   Data preview: {str(data)[:100]}...")
                     except Exception as e:
                         print(f"❌ Failed to read {resource.uri}: {e}")
@@ -68,4 +86,7 @@ async def test_mcp():
 
 
 if __name__ == "__main__":
-    asyncio.run(test_mcp())
+    # Same loop as the agent and server: uvloop when installed
+    sys.path.insert(0, str(ROOT))
+    from mcp_common import run_async
+    run_async(test_mcp())